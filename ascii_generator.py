@@ -0,0 +1,45 @@
+"""
+Single command line for every converter: `python ascii_generator.py <command> [options]`, where the options
+are those of the script behind the command (`python ascii_generator.py <command> --help` lists them).
+
+Only the modules of the chosen command are imported, so a text conversion never loads the image rendering,
+video or server code.
+"""
+import argparse
+import importlib
+
+# Command name: (module, description)
+COMMANDS = {
+    "txt": ("img2txt", "image to text"),
+    "img": ("img2img", "image to grayscale ASCII art image"),
+    "img-color": ("img2img_color", "image to color ASCII art image"),
+    "video": ("video2video", "video to grayscale ASCII art video"),
+    "video-color": ("video2video_color", "video to color ASCII art video"),
+    "video-txt": ("video2txt", "video to a text stream, in the terminal or a file"),
+    "live": ("live", "camera, stream or test pattern shown live within a latency budget"),
+    "render": ("render_grid", "grid file saved with --save_grid to text, HTML, image or video"),
+    "batch": ("batch", "many images at once"),
+    "serve": ("server", "local HTTP conversion server"),
+    "benchmark": ("benchmark", "per-stage timings of every converter"),
+    "cache": ("charset_cache", "prebuild the character set cache"),
+}
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("ascii_generator", formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="commands:\n" + "\n".join("  {:<13} {}".format(name, description)
+                                                                      for name, (_, description) in COMMANDS.items()))
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="one of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="options of the command")
+    args = parser.parse_args(argv)
+    return args
+
+
+def main(opt):
+    module = importlib.import_module(COMMANDS[opt.command][0])
+    module.main(module.get_args(opt.args))
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
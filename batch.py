@@ -0,0 +1,197 @@
+"""
+Convert many images at once: directories, glob patterns or a manifest file with one path per line.
+
+Outputs mirror the input tree under the output directory. Each worker process keeps its fonts, character
+ramps and glyph atlases loaded across images, up-to-date outputs are skipped and a failing image is reported
+without stopping the batch.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from multiprocessing import Pool
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".ppm", ".pgm")
+STATE_FILE = ".batch_state.json"
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Batch image to ASCII")
+    parser.add_argument("--input", type=str, nargs="*", default=[], help="Input images, directories or glob patterns")
+    parser.add_argument("--manifest", type=str, default=None, help="Text file listing one input path per line")
+    parser.add_argument("--output", type=str, default="data/output", help="Root of the mirrored output tree")
+    parser.add_argument("--type", type=str, default="img", choices=["txt", "img", "img_color"],
+                        help="convert with img2txt, img2img or img2img_color")
+    parser.add_argument("--ext", type=str, default=None,
+                        help="output extension, .txt for text and the input extension for images by default")
+    parser.add_argument("--language", type=str, default="english")
+    parser.add_argument("--mode", type=str, default=None, help="character set, the converter's default if unset")
+    parser.add_argument("--background", type=str, default="black", choices=["black", "white"],
+                        help="background's color")
+    parser.add_argument("--num_cols", type=int, default=None, help="number of character for output's width")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--check", type=str, default="mtime", choices=["mtime", "hash", "none"],
+                        help="how to detect outputs that are already up to date")
+    args = parser.parse_args(argv)
+    return args
+
+
+def is_under(path, root):
+    path = os.path.abspath(path)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def find_images(inputs, manifest=None, exclude=None):
+    """Return (path, relative output path) pairs for every image found in the inputs.
+
+    Directories and glob patterns skip everything under `exclude`, the output root, unless they are inside it
+    themselves: otherwise an output tree inside an input directory would be converted again on every run.
+    """
+    pairs = []
+    files = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            skip = exclude if exclude and not is_under(pattern, exclude) else None
+            for root, dirs, names in os.walk(pattern):
+                if skip:
+                    dirs[:] = [name for name in dirs if not is_under(os.path.join(root, name), skip)]
+                for name in sorted(names):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        pairs.append((path, os.path.relpath(path, pattern)))
+        elif glob.has_magic(pattern):
+            base = pattern[:min(pattern.index(c) for c in "*?[" if c in pattern)]
+            base = base if base.endswith(os.sep) else os.path.dirname(base)
+            skip = exclude if exclude and not is_under(base or ".", exclude) else None
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path) and not (skip and is_under(path, skip)):
+                    pairs.append((path, os.path.relpath(path, base or ".")))
+        else:
+            files.append(pattern)
+    if manifest is not None:
+        with open(manifest, encoding="utf-8") as f:
+            files.extend(line.strip() for line in f if line.strip())
+    if files:
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+        pairs.extend((path, os.path.relpath(os.path.abspath(path), base)) for path in files)
+    return pairs
+
+
+def conversion_options(opt):
+    options = {"language": opt.language, "background": opt.background}
+    if opt.type == "txt":
+        options.update(mode=opt.mode or "complex", num_cols=opt.num_cols or 150)
+    else:
+        options.update(mode=opt.mode or "standard", num_cols=opt.num_cols or 300)
+    return options
+
+
+def input_hash(path, options):
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_worker = {}
+
+
+def init_worker(kind, options):
+    if kind == "txt":
+        import img2txt as converter
+    elif kind == "img":
+        import img2img as converter
+    else:
+        import img2img_color as converter
+    if kind != "txt":
+        # Loads the font and the character ramp once for the lifetime of the worker
+        from utils import get_data
+        get_data(options["language"], options["mode"])
+    _worker["converter"] = converter
+    _worker["options"] = options
+
+
+def convert(job):
+    path, output, digest = job
+    # Written under a temporary name, so that a failed conversion never leaves an output that looks up to date
+    root, ext = os.path.splitext(output)
+    partial = root + ".partial" + ext
+    try:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        # Every option the batch does not set keeps the default of the script's own parser
+        args = _worker["converter"].get_args(["--input", path, "--output", partial])
+        vars(args).update(_worker["options"])
+        _worker["converter"].main(args)
+        os.replace(partial, output)
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        return path, digest, "{}: {}".format(type(e).__name__, " ".join(str(e).split()))
+    return path, digest, None
+
+
+def main(opt):
+    pairs = find_images(opt.input, opt.manifest, os.path.abspath(opt.output))
+    options = conversion_options(opt)
+    state_path = os.path.join(opt.output, STATE_FILE)
+    state = {}
+    if opt.check == "hash" and os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    outputs = {}
+    for path, relative in pairs:
+        root, ext = os.path.splitext(relative)
+        output = os.path.join(opt.output, root + (opt.ext or (".txt" if opt.type == "txt" else ext)))
+        outputs.setdefault(output, []).append((path, relative))
+    jobs = []
+    conflicts = []
+    for output, sources in outputs.items():
+        if len(sources) > 1:
+            # e.g. a.jpg and a.png converted to text: neither may overwrite the other
+            names = ", ".join(path for path, _ in sources)
+            conflicts.extend((path, "{} would be the output of each of {}".format(output, names))
+                             for path, _ in sources)
+            continue
+        path, relative = sources[0]
+        digest = None
+        if opt.check == "mtime":
+            if os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(path):
+                continue
+        elif opt.check == "hash":
+            # The kind and format of the output count too, so that changing them converts again
+            digest = input_hash(path, dict(options, type=opt.type, ext=os.path.splitext(output)[1]))
+            if os.path.exists(output) and state.get(relative) == digest:
+                continue
+            digest = (relative, digest)
+        jobs.append((path, output, digest))
+    skipped = len(pairs) - len(jobs) - len(conflicts)
+
+    failures = []
+    start = time.time()
+    with Pool(max(opt.workers, 1), initializer=init_worker, initargs=(opt.type, options)) as pool:
+        for done, (path, digest, error) in enumerate(pool.imap_unordered(convert, jobs, chunksize=4), 1):
+            if error is not None:
+                failures.append((path, error))
+            elif digest is not None:
+                state[digest[0]] = digest[1]
+            if done % 100 == 0:
+                print("{}/{} images, {:.1f} images/sec".format(done, len(jobs), done / (time.time() - start)))
+    elapsed = time.time() - start
+
+    if opt.check == "hash":
+        os.makedirs(opt.output, exist_ok=True)
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    print("Converted {} images in {:.2f}s ({:.1f} images/sec), skipped {} up to date, {} failed".format(
+        len(jobs) - len(failures), elapsed, (len(jobs) - len(failures)) / elapsed if elapsed else 0, skipped,
+        len(conflicts) + len(failures)))
+    for path, error in conflicts + failures:
+        print("Failed {}: {}".format(path, error))
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
@@ -0,0 +1,237 @@
+"""
+Benchmark every converter on synthetic inputs and report per-stage timings, throughput and peak memory. Each case
+runs the main() of its script, and the stages are those the code records with the profiling module.
+
+Results can be saved as JSON and compared against a previously saved baseline to quantify speedups and
+regressions.
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import profiling
+from languages import LANGUAGES, get_alphabet
+
+ENTRY_POINTS = ["img2txt", "img2img", "img2img_color", "video2video", "video2video_color"]
+# Command of the unified CLI running each entry point
+COMMANDS = {"img2txt": "txt", "img2img": "img", "img2img_color": "img-color", "video2video": "video",
+            "video2video_color": "video-color"}
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Benchmark the ASCII converters")
+    parser.add_argument("--entry", type=str, nargs="*", default=ENTRY_POINTS, choices=ENTRY_POINTS,
+                        help="converters to benchmark")
+    parser.add_argument("--full", action="store_true",
+                        help="every resolution, num_cols and language/mode instead of the quick set")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the median is reported")
+    parser.add_argument("--num_frames", type=int, default=20, help="frames of the synthetic videos")
+    parser.add_argument("--cold_start", action="store_true",
+                        help="also time a fresh interpreter converting a small input with ascii_generator.py")
+    parser.add_argument("--output", type=str, default=None, help="Path to the JSON results")
+    parser.add_argument("--baseline", type=str, default=None, help="Path to JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown above which a case is reported as a regression")
+    args = parser.parse_args(argv)
+    return args
+
+
+def synthetic_image(width, height, seed=0):
+    """Gradients, shapes and noise, so that every part of the character ramp is used"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:height, :width]
+    image = np.stack([255 * x / width, 255 * y / height, 127 + 127 * np.sin((x + y) / 40)], axis=2)
+    image = (image + rng.normal(0, 12, image.shape)).clip(0, 255).astype(np.uint8)
+    for _ in range(12):
+        center = (int(rng.integers(width)), int(rng.integers(height)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(image, center, int(rng.integers(height // 20, height // 4)), color, -1)
+    return image
+
+
+def synthetic_video(path, width, height, num_frames, fps=25):
+    image = synthetic_image(width, height)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for i in range(num_frames):
+        out.write(np.roll(image, 8 * i, axis=1))
+    out.release()
+
+
+def language_modes():
+    for language in LANGUAGES:
+        for mode in get_alphabet(language):
+            yield language, mode
+
+
+def get_cases(entries, full):
+    resolutions = [(640, 360), (1280, 720), (1920, 1080)] if full else [(1280, 720)]
+    num_cols_list = [50, 150, 300, 600, 1000] if full else [50, 300, 1000]
+    cases = []
+    for entry in entries:
+        if entry == "img2txt":
+            languages = [("general", "simple"), ("general", "complex")]
+        elif entry.startswith("video"):
+            languages = [("general", "simple"), ("general", "complex")] if full else [("general", "complex")]
+        else:
+            languages = list(language_modes()) if full else [("english", "standard"), ("general", "complex")]
+        for width, height in resolutions:
+            for num_cols in num_cols_list:
+                if entry.startswith("video") and num_cols > 300:
+                    continue
+                for language, mode in languages:
+                    cases.append(OrderedDict([("entry", entry), ("resolution", "{}x{}".format(width, height)),
+                                              ("num_cols", num_cols), ("language", language), ("mode", mode)]))
+    return cases
+
+
+def case_key(case):
+    return "{entry}/{resolution}/{num_cols}/{language}-{mode}".format(**case)
+
+
+def entry_args(case, path, output):
+    """Command line of an entry point converting `path` into `output` for a case"""
+    args = ["--input", path, "--output", output, "--mode", case["mode"], "--num_cols", str(case["num_cols"])]
+    if case["entry"] in ("img2img", "img2img_color"):
+        args += ["--language", case["language"]]
+    return args
+
+
+def run_entry(case, path, output):
+    """Run the main() of an entry point and return the total time of every stage it recorded, and its number of
+    output frames"""
+    module = importlib.import_module(case["entry"])
+    profiling.reset()
+    module.main(module.get_args(entry_args(case, path, output)))
+    stats, _ = profiling.drain()
+    stages = OrderedDict((name, total) for name, (_, total, _) in stats.items())
+    return stages, stats["write"][0] if "write" in stats else 1
+
+
+def run_case(case, inputs, workdir, repeat):
+    width, height = (int(v) for v in case["resolution"].split("x"))
+    if case["entry"].startswith("video"):
+        path, output = inputs[(width, height, "video")], os.path.join(workdir, "out.avi")
+    else:
+        path = inputs[(width, height, "image")]
+        output = os.path.join(workdir, "out.txt" if case["entry"] == "img2txt" else "out.png")
+
+    # Warm up fonts, ramps and glyph atlases so that only the conversion itself is measured
+    run_entry(case, path, output)
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stages, num_items = run_entry(case, path, output)
+        runs.append((time.perf_counter() - start, num_items, stages))
+    tracemalloc.start()
+    run_entry(case, path, output)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    total = statistics.median(r[0] for r in runs)
+    stages = OrderedDict((stage, statistics.median(r[2].get(stage, 0) for r in runs)) for stage in runs[0][2])
+    return OrderedDict([("total", total), ("throughput", runs[0][1] / total), ("peak_memory", peak),
+                        ("stages", stages)])
+
+
+def cold_start(entry, workdir, repeat):
+    """Median wall time of a new process converting a small input through the unified CLI, imports included"""
+    if entry.startswith("video"):
+        path = os.path.join(workdir, "cold.avi")
+        if not os.path.exists(path):
+            synthetic_video(path, 320, 180, 5)
+        args = ["--input", path, "--output", os.path.join(workdir, "cold_out.avi"), "--num_cols", "50"]
+    else:
+        path = os.path.join(workdir, "cold.jpg")
+        if not os.path.exists(path):
+            cv2.imwrite(path, synthetic_image(320, 180))
+        extension = ".txt" if entry == "img2txt" else ".png"
+        args = ["--input", path, "--output", os.path.join(workdir, "cold_out" + extension), "--num_cols", "50"]
+    command = [sys.executable, "ascii_generator.py", COMMANDS[entry]] + args
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    # The first run only warms the file system cache and the character set cache
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    total = statistics.median(times[1:])
+    return OrderedDict([("total", total), ("throughput", 1 / total), ("peak_memory", 0), ("stages", {})])
+
+
+def compare(results, baseline, tolerance):
+    print("\n{:<60} {:>10} {:>10} {:>8}".format("case", "baseline", "current", "speedup"))
+    regressions = 0
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before, after = baseline[key]["total"], result["total"]
+        flag = ""
+        if after > before * (1 + tolerance):
+            flag = "  REGRESSION"
+            regressions += 1
+        print("{:<60} {:>9.1f}ms {:>9.1f}ms {:>7.2f}x{}".format(key, 1000 * before, 1000 * after, before / after,
+                                                                  flag))
+    print("{} regressions".format(regressions))
+    return regressions
+
+
+def main(opt):
+    # Enabled here rather than with --profile, so that the scripts record their stages without printing them
+    profiling.enable()
+    cases = get_cases(opt.entry, opt.full)
+    workdir = tempfile.mkdtemp()
+    inputs = {}
+    results = OrderedDict()
+    try:
+        print("{:<60} {:>10} {:>12} {:>10}  stages (ms)".format("case", "total", "throughput", "peak"))
+        for case in cases:
+            width, height = (int(v) for v in case["resolution"].split("x"))
+            if (width, height, "image") not in inputs:
+                inputs[(width, height, "image")] = os.path.join(workdir, "{}x{}.jpg".format(width, height))
+                cv2.imwrite(inputs[(width, height, "image")], synthetic_image(width, height))
+                path = os.path.join(workdir, "{}x{}.avi".format(width, height))
+                synthetic_video(path, width, height, opt.num_frames)
+                inputs[(width, height, "video")] = path
+            key = case_key(case)
+            try:
+                result = run_case(case, inputs, workdir, opt.repeat)
+            except OSError as e:
+                # Fonts that are not shipped with the repository
+                print("{:<60} skipped: {}".format(key, e))
+                continue
+            result["case"] = case
+            results[key] = result
+            unit = "fps" if case["entry"].startswith("video") else "img/s"
+            print("{:<60} {:>8.1f}ms {:>6.1f} {:<5} {:>8.1f}MB  {}".format(
+                key, 1000 * result["total"], result["throughput"], unit, result["peak_memory"] / 2 ** 20,
+                " ".join("{}={:.1f}".format(stage, 1000 * value) for stage, value in result["stages"].items())))
+        if opt.cold_start:
+            print("\n{:<60} {:>10}".format("cold start", "total"))
+            for entry in opt.entry:
+                key = "cold_start/{}".format(entry)
+                results[key] = cold_start(entry, workdir, opt.repeat)
+                print("{:<60} {:>8.1f}ms".format(key, 1000 * results[key]["total"]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if opt.output:
+        with open(opt.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if opt.baseline:
+        with open(opt.baseline) as f:
+            if compare(results, json.load(f), opt.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
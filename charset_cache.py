@@ -0,0 +1,119 @@
+"""
+Persistent cache of sorted character ramps, measured glyph densities and per-glyph cell coverage.
+
+Profiles are keyed by language, mode, the hash of the font file, the font size and the hash of the alphabet,
+so editing alphabets.py or replacing a font file simply produces a new key. Run this file to prebuild the
+cache for every language and mode in alphabets.py.
+"""
+import argparse
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+CACHE_DIR = os.environ.get("ASCII_GENERATOR_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "ascii_generator"))
+
+_profiles = {}
+
+
+@lru_cache(maxsize=None)
+def _file_hash(path, mtime, size):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def font_hash(path):
+    stat = os.stat(path)
+    return _file_hash(path, stat.st_mtime_ns, stat.st_size)
+
+
+def profile_key(language, mode, char_list, font):
+    alphabet_hash = hashlib.sha1(char_list.encode("utf-8")).hexdigest()
+    return "{}-{}-{}-{}-{}".format(language, mode, font_hash(font.path)[:16], font.size, alphabet_hash[:16])
+
+
+def load_profile(key):
+    if key in _profiles:
+        return _profiles[key]
+    try:
+        with open(os.path.join(CACHE_DIR, key + ".json"), encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _profiles[key] = profile
+    return profile
+
+
+def save_profile(key, profile):
+    _profiles[key] = profile
+    path = os.path.join(CACHE_DIR, key + ".json")
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Written under a temporary name first so concurrent jobs never read a partial file
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def get_profile(language, mode, char_list, font, measure, select):
+    key = profile_key(language, mode, char_list, font)
+    profile = load_profile(key)
+    if profile is None:
+        densities = measure(char_list, font, language)
+        profile = {"language": language, "mode": mode, "font": os.path.basename(font.path), "size": font.size,
+                   "alphabet": char_list, "densities": densities, "char_list": select(densities, char_list)}
+        save_profile(key, profile)
+    return profile
+
+
+def get_coverage(char_list, font, char_width, char_height, measure):
+    # The measured height is part of the key, so profiles of glyphs clipped to char_height are not reused
+    ascent, descent = font.getmetrics()
+    key = "coverage-{}-{}-{}x{}-{}-{}".format(font_hash(font.path)[:16], font.size, char_width, char_height,
+                                              max(ascent + descent, char_height),
+                                              hashlib.sha1(char_list.encode("utf-8")).hexdigest()[:16])
+    profile = load_profile(key)
+    if profile is None:
+        profile = {"font": os.path.basename(font.path), "size": font.size, "cell": [char_width, char_height],
+                   "alphabet": char_list, "coverage": measure(char_list, font, char_width, char_height)}
+        save_profile(key, profile)
+    return profile["coverage"]
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Prebuild the character set cache")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR, help="Directory storing the profiles")
+    args = parser.parse_args(argv)
+    return args
+
+
+def main(opt):
+    # Set on the imported module that utils reads, which is not this one when the file is run as a script
+    import charset_cache
+    charset_cache.CACHE_DIR = opt.cache_dir
+    from languages import LANGUAGES, get_alphabet
+    from utils import get_data
+    for language, spec in LANGUAGES.items():
+        if spec.sorted:
+            # Sorted character lists are used as is
+            continue
+        for mode in get_alphabet(language):
+            try:
+                char_list, _, _, _ = get_data(language, mode)
+            except OSError as e:
+                print("Skipped {} ({}): {}".format(language, mode, e))
+                continue
+            if char_list is not None:
+                print("Cached {} ({}): {} characters".format(language, mode, len(char_list)))
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
@@ -0,0 +1,408 @@
+"""
+Library API: convert in-memory images and video frames to ASCII art without going through files.
+
+Images are numpy arrays in OpenCV's BGR channel order (or single channel grayscale), as returned by cv2.imread
+or cv2.VideoCapture.read.
+"""
+from functools import cached_property
+
+import cv2
+import numpy as np
+import profiling
+from grid import get_grid, get_edges, cell_counts, reduce_cells, sums_to_means, sums_to_colors, cell_colors, \
+    cell_means, char_indices, char_lut
+from plan import RenderPlan, content_box
+from ramp import get_ramp, tone_curve, equalize_curve, build_lut, to_levels
+from languages import LANGUAGES
+from utils import get_chars, get_font
+
+
+def decode_image(data):
+    """Decode encoded image bytes (JPEG, PNG, ...) into a BGR array"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Cannot decode image")
+    return image
+
+
+def read_image(path, flags=cv2.IMREAD_COLOR):
+    """Read an image file into a BGR array"""
+    image = cv2.imread(path, flags)
+    if image is None:
+        raise ValueError("Cannot read image {}".format(path))
+    return image
+
+
+def to_gray(image):
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def to_bgr(image):
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+def add_mapping_args(parser, shape=True):
+    """Add the Converter's luminance mapping options to a script's parser, and its shape matching ones if `shape`"""
+    parser.add_argument("--ramp", type=str, default="standard", choices=["standard", "coverage"],
+                        help="sorted character ramp, or every glyph ordered by its exact ink coverage")
+    parser.add_argument("--gamma", type=float, default=1.0, help="gamma applied to cell luminance")
+    parser.add_argument("--contrast", type=float, default=1.0, help="contrast stretch around mid gray")
+    parser.add_argument("--equalize", action="store_true", help="equalize the histogram of cell luminance")
+    if shape:
+        parser.add_argument("--match", type=str, default="luminance", choices=["luminance", "shape"],
+                            help="pick characters by cell brightness, or by matching sub-cell shapes against glyphs")
+        parser.add_argument("--subgrid", type=int, nargs=2, default=[4, 8],
+                            help="columns and rows of sub-cells per character in shape matching")
+
+
+def mapping_kwargs(opt):
+    """Converter keyword arguments of the options add_mapping_args added"""
+    kwargs = {"ramp": opt.ramp, "gamma": opt.gamma, "contrast": opt.contrast, "equalize": opt.equalize}
+    if hasattr(opt, "match"):
+        kwargs.update(match=opt.match, subgrid=tuple(opt.subgrid))
+    return kwargs
+
+
+class Converter(object):
+    """Holds a loaded font, sorted character ramp and glyph atlas, ready to convert any number of images.
+
+    `color` renders every character with the average color of its cell instead of a single foreground color.
+    `font_size` overrides the size of the language's font, as the video scripts do with their --scale option.
+    `ramp`, `gamma`, `contrast` and `equalize` switch luminance mapping to a 256-entry lookup table (see ramp.py):
+    "coverage" orders the whole alphabet by the exact ink coverage of every glyph instead of the sorted ramp.
+    `match="shape"` picks characters by matching a `subgrid` (columns, rows) of sub-cells against the glyph shapes
+    instead of by brightness alone (see shapes.py).
+    `char_list` replaces the character list of the language and mode, e.g. by the one a saved grid was made with.
+    `divide_first` maps luminance to characters with img2img.py's evaluation order (see grid.char_indices).
+    """
+
+    def __init__(self, language="english", mode="standard", num_cols=300, background="black", color=False,
+                 font_size=None, ramp="standard", gamma=1.0, contrast=1.0, equalize=False, match="luminance",
+                 subgrid=(4, 8), char_list=None, divide_first=False):
+        if char_list is None:
+            with profiling.stage("load"):
+                char_list = get_chars(language, mode, ramp)
+        if char_list is None or language not in LANGUAGES:
+            raise ValueError("Invalid language {} or mode {}".format(language, mode))
+        spec = LANGUAGES[language]
+        self.language = language
+        self.mode = mode
+        self.ramp = ramp
+        self.font_size = font_size or spec.font_size
+        self.sample_character = spec.sample_character
+        self.char_list = char_list
+        self.scale = spec.scale
+        self.num_cols = num_cols
+        self.color = color
+        self.divide_first = divide_first
+        if background == "white":
+            self.background = (255, 255, 255) if color else 255
+        else:
+            self.background = (0, 0, 0) if color else 0
+        self.canvas = None
+        self.canvas_size = None
+        self.equalize = equalize
+        self.levels = None
+        if ramp != "standard" or gamma != 1 or contrast != 1 or equalize:
+            with profiling.stage("load"):
+                self.char_list, self.levels = get_ramp(char_list, self.font, self.char_width, self.char_height,
+                                                       ramp)
+            self.curve = tone_curve(gamma, contrast)
+            self.lut = build_lut(self.levels, self.curve)
+        self.matcher = None
+        if match == "shape":
+            from shapes import ShapeMatcher
+            with profiling.stage("load"):
+                self.matcher = ShapeMatcher(self.char_list, self.font, self.char_width, self.char_height, subgrid)
+
+    # The font, cell size and glyph atlas are loaded on first use, so text-only conversions of sorted languages
+    # neither import PIL nor rasterize glyphs
+    @property
+    def font(self):
+        return get_font(self.language, self.font_size)
+
+    @cached_property
+    def char_size(self):
+        return self.font.getsize(self.sample_character)
+
+    @property
+    def char_width(self):
+        return self.char_size[0]
+
+    @property
+    def char_height(self):
+        return self.char_size[1]
+
+    @property
+    def atlas(self):
+        from renderer import get_atlas
+        return get_atlas(self.char_list, self.font, self.char_width, self.char_height)
+
+    def grid(self, image):
+        height, width = image.shape[:2]
+        return get_grid(height, width, self.num_cols, self.scale)
+
+    def analyze(self, image):
+        """Return the character index grid of an image, and its cell colors in color mode"""
+        cell_width, cell_height, num_cols, num_rows = self.grid(image)
+        colors = None
+        with profiling.stage("grid"):
+            if self.color:
+                colors, means = cell_colors(to_bgr(image), cell_width, cell_height, num_cols, num_rows)
+            elif self.matcher is None:
+                means = cell_means(to_gray(image), cell_width, cell_height, num_cols, num_rows)
+            if self.matcher is not None:
+                edges = self.matcher.edges(image.shape[0], image.shape[1], cell_width, cell_height, num_cols,
+                                           num_rows)
+                means = sums_to_means(reduce_cells(to_gray(image), edges), cell_counts(edges))
+        with profiling.stage("map"):
+            if self.matcher is not None:
+                return self.matcher.match(means, cell_width, cell_height), colors
+            return self.map_cells(means), colors
+
+    def map_cells(self, means):
+        """Return the character index of every cell luminance"""
+        if self.levels is None:
+            return char_indices(means, len(self.char_list), self.divide_first)
+        levels = to_levels(means)
+        lut = self.lut
+        if self.equalize:
+            lut = build_lut(self.levels, np.interp(equalize_curve(levels), np.arange(256), self.curve))
+        return lut[levels]
+
+    def iter_lines(self, image, band_rows=16):
+        """Yield the text rows of an image as they are computed, reducing `band_rows` rows of cells at a time"""
+        cell_width, cell_height, num_cols, num_rows = self.grid(image)
+        row_starts, row_ends, col_starts, col_ends = get_edges(image.shape[0], image.shape[1], cell_width,
+                                                               cell_height, num_cols, num_rows)
+        lut = char_lut(self.char_list)
+        if self.matcher is not None:
+            # Rows of sub-cells instead of cells
+            row_starts, row_ends, col_starts, col_ends = self.matcher.edges(image.shape[0], image.shape[1],
+                                                                            cell_width, cell_height, num_cols,
+                                                                            num_rows)
+            band_rows *= len(row_starts) // num_rows
+            num_rows = len(row_starts)
+        elif self.equalize:
+            # Equalization needs the histogram of the whole image first
+            for row in lut[self.analyze(image)[0]]:
+                yield "".join(row)
+            return
+        for start in range(0, num_rows, band_rows):
+            stop = min(start + band_rows, num_rows)
+            top = row_starts[start]
+            with profiling.stage("grid"):
+                band = to_gray(image[top:row_ends[stop - 1]])
+                edges = (row_starts[start:stop] - top, row_ends[start:stop] - top, col_starts, col_ends)
+                means = sums_to_means(reduce_cells(band, edges), cell_counts(edges))
+            with profiling.stage("map"):
+                if self.matcher is not None:
+                    indices = self.matcher.match(means, cell_width, cell_height)
+                else:
+                    indices = self.map_cells(means)
+                rows = ["".join(row) for row in lut[indices]]
+            for row in rows:
+                yield row
+
+    def to_lines(self, image):
+        return list(self.iter_lines(image))
+
+    def to_text(self, image):
+        return "".join(line + "\n" for line in self.iter_lines(image))
+
+    def render(self, indices, colors=None):
+        """Render a character grid to an uncropped canvas, reusing the work canvas if the last grid had this size"""
+        num_rows, num_cols = indices.shape
+        out_width = self.char_width * num_cols
+        out_height = self.scale * self.char_height * num_rows
+        if self.canvas_size != (num_rows, num_cols):
+            # Only the last size is kept: sizes follow the aspect ratio of the images, so a long-lived converter
+            # would otherwise hold one canvas for every image shape it has seen
+            self.canvas = self.atlas.allocate(num_rows, num_cols, out_height, out_width, 3 if self.color else 0)
+            self.canvas_size = (num_rows, num_cols)
+        canvas = self.canvas
+        with profiling.stage("render"):
+            if self.color:
+                self.atlas.compose(indices, colors, self.background, canvas)
+            else:
+                foreground = 255 - self.background
+                self.atlas.compose(indices, foreground, self.background, canvas)
+        return self.atlas.view(canvas, out_height, out_width)
+
+    def release_canvas(self):
+        """Free the work canvas kept for the next render, for converters that stay alive between unrelated images"""
+        self.canvas = None
+        self.canvas_size = None
+
+    def to_image(self, image, cells=None):
+        """Return the ASCII art of an image as a new array, BGR in color mode and grayscale otherwise.
+
+        `cells` is the (indices, colors) pair analyze() returned for the image, to render it without analyzing
+        it again.
+        """
+        indices, colors = self.analyze(image) if cells is None else cells
+        out_image = self.render(indices, colors)
+        with profiling.stage("crop"):
+            box = content_box(out_image, self.background)
+            if box is not None:
+                left, top, right, bottom = box
+                out_image = out_image[top:bottom, left:right]
+            return out_image.astype(np.uint8)
+
+    def to_pil(self, image, cells=None):
+        from PIL import Image
+        out_image = self.to_image(image, cells)
+        if self.color:
+            out_image = out_image[:, :, ::-1]
+        return Image.fromarray(out_image)
+
+    def to_palette(self, image, num_colors=16, cells=None):
+        """Return the color ASCII art of an image as a palette ("P" mode) PIL image.
+
+        Cell colors are quantized to `num_colors` by median cut and each of them gets 255 // num_colors coverage
+        levels for the glyph edges, so fewer colors buy smoother edges and a smaller file.
+        """
+        from PIL import Image
+        if not self.color:
+            raise ValueError("Palette mode needs a color converter")
+        if not 1 <= num_colors <= 255:
+            raise ValueError("Number of palette colors must be between 1 and 255")
+        indices, colors = self.analyze(image) if cells is None else cells
+        rgb = np.clip(colors[:, :, ::-1], 0, 255).astype(np.uint8)
+        with profiling.stage("quantize"):
+            quantized = Image.fromarray(rgb).quantize(num_colors, method=Image.MEDIANCUT)
+            color_ids = np.array(quantized)
+            palette = np.zeros((num_colors, 3), dtype=np.int64)
+            used = np.array(quantized.getpalette()[:3 * num_colors]).reshape(-1, 3)
+            palette[:len(used)] = used
+        num_rows, num_cols = indices.shape
+        levels = 255 // num_colors
+        with profiling.stage("render"):
+            out_image = self.atlas.render_indexed(indices, color_ids, levels, self.scale * self.char_height * num_rows,
+                                                  self.char_width * num_cols)
+        with profiling.stage("crop"):
+            box = content_box(out_image, 0)
+            if box is not None:
+                left, top, right, bottom = box
+                out_image = out_image[top:bottom, left:right]
+        # Same integer blend as the renderer, between the background and every color at every coverage level
+        background = np.array(self.background[::-1])
+        alphas = (255 * np.arange(1, levels + 1) + levels // 2) // levels
+        entries = (background * (255 - alphas[:, None]) + palette[:, None] * alphas[:, None] + 127) // 255
+        result = Image.fromarray(np.ascontiguousarray(out_image), "P")
+        result.putpalette([int(v) for v in np.concatenate([background[None], entries.reshape(-1, 3)]).ravel()])
+        return result
+
+    def to_bytes(self, image, ext=".png"):
+        flag, data = cv2.imencode(ext, self.to_image(image))
+        if not flag:
+            raise ValueError("Cannot encode image as {}".format(ext))
+        return data.tobytes()
+
+    def analyze_bands(self, reader, band_rows=64):
+        """Like analyze, for an image read `band_rows` rows of cells at a time from a band reader (see tiles.py)"""
+        cell_width, cell_height, num_cols, num_rows = get_grid(reader.height, reader.width, self.num_cols,
+                                                               self.scale)
+        row_starts, row_ends, col_starts, col_ends = get_edges(reader.height, reader.width, cell_width,
+                                                               cell_height, num_cols, num_rows)
+        means = np.empty((num_rows, num_cols))
+        colors = np.empty((num_rows, num_cols, 3), dtype=np.int32) if self.color else None
+        if self.matcher is not None:
+            sub_edges = self.matcher.edges(reader.height, reader.width, cell_width, cell_height, num_cols, num_rows)
+            sub_rows = len(sub_edges[0]) // num_rows
+            indices = np.empty((num_rows, num_cols), dtype=np.intp)
+        for start in range(0, num_rows, band_rows):
+            stop = min(start + band_rows, num_rows)
+            top, bottom = row_starts[start], row_ends[stop - 1]
+            if self.matcher is not None:
+                sub_starts = sub_edges[0][start * sub_rows:stop * sub_rows]
+                sub_ends = sub_edges[1][start * sub_rows:stop * sub_rows]
+                top, bottom = min(top, sub_starts[0]), max(bottom, sub_ends[-1])
+            with profiling.stage("decode"):
+                band = reader.read(top, bottom)
+            with profiling.stage("grid"):
+                image = to_bgr(band) if self.color else to_gray(band)
+                edges = (row_starts[start:stop] - top, row_ends[start:stop] - top, col_starts, col_ends)
+                sums = reduce_cells(image, edges)
+                if self.color:
+                    colors[start:stop] = sums_to_colors(sums, cell_width, cell_height)
+                means[start:stop] = sums_to_means(sums, cell_counts(edges))
+            if self.matcher is not None:
+                edges = (sub_starts - top, sub_ends - top, sub_edges[2], sub_edges[3])
+                with profiling.stage("map"):
+                    sub_means = sums_to_means(reduce_cells(to_gray(band), edges), cell_counts(edges))
+                    indices[start:stop] = self.matcher.match(sub_means, cell_width, cell_height)
+        if self.matcher is not None:
+            return indices, colors
+        with profiling.stage("map"):
+            return self.map_cells(means), colors
+
+    def to_strips(self, reader, band_rows=64):
+        """Return the (width, height) of the cropped ASCII art of a band reader's image, and an iterator over
+        its horizontal strips, so that neither the input nor the output image is ever held whole.
+
+        The crop box comes from the character grid and the glyph masks, so the output is only rendered once.
+        """
+        indices, colors = self.analyze_bands(reader, band_rows)
+        num_rows, num_cols = indices.shape
+        out_width = self.char_width * num_cols
+        out_height = self.scale * self.char_height * num_rows
+        fill = colors if self.color else 255 - self.background
+        with profiling.stage("crop"):
+            box = self.atlas.ink_box(indices, fill, self.background, out_height, out_width)
+        left, top, right, bottom = box or (0, 0, out_width, out_height)
+
+        def strips():
+            offset = 0
+            for strip in self.atlas.strips(indices, fill, self.background, out_height, out_width, band_rows):
+                start, stop = max(top - offset, 0), min(bottom - offset, len(strip))
+                offset += len(strip)
+                if start < stop:
+                    yield strip[start:stop, left:right].astype(np.uint8)
+
+        return (right - left, bottom - top), strips()
+
+    def plan(self, frame, overlay_ratio=0, incremental=False, threshold=0, gray=False, num_frames=1):
+        """Return the render plan of a video stream whose first frame is `frame`"""
+        return RenderPlan(frame.shape, self.num_cols, self.scale, (self.char_width, self.char_height),
+                          self.background, overlay_ratio, incremental, threshold, gray, num_frames)
+
+    def frame_cells(self, frame, plan):
+        """Return the character index grid of a video frame, and its BGR cell colors in color mode"""
+        if self.color:
+            frame = to_bgr(frame)
+        if self.matcher is not None:
+            return plan.shape_indices(frame, self.matcher, self.color)
+        if self.color:
+            return plan.color_indices(frame, self.map_cells)
+        return plan.gray_indices(frame, self.map_cells), None
+
+    def render_frame(self, frame, plan):
+        """Render one video frame with a plan. The returned array is reused num_frames calls later"""
+        indices, colors = self.frame_cells(frame, plan)
+        return self.render_cells(indices, colors, frame, plan)
+
+    def render_cells(self, indices, colors, frame, plan):
+        """Render the cells frame_cells() returned for a frame, as render_frame does"""
+        if plan.overlay_ratio:
+            # The overlay is a BGR copy of the frame
+            frame = to_bgr(frame)
+        if self.color:
+            return plan.render(self.atlas, indices, colors, frame)
+        return plan.render(self.atlas, indices, 255 - self.background, frame)
+
+    def iter_video(self, frames, overlay_ratio=0, incremental=False, threshold=0):
+        """Yield the BGR ASCII art of every frame. Each yielded array is only valid until the next one"""
+        plan = None
+        for frame in frames:
+            if plan is None:
+                plan = self.plan(frame, overlay_ratio, incremental, threshold)
+            yield self.render_frame(frame, plan)
@@ -0,0 +1,84 @@
+import sys
+
+import numpy as np
+
+
+def cell_edges(length, cell_size, num_cells):
+    # Same boundaries as int(i * cell_size):min(int((i + 1) * cell_size), length) in the original loops
+    edges = (np.arange(num_cells + 1) * cell_size).astype(np.int64)
+    return edges[:-1], np.minimum(edges[1:], length)
+
+
+def get_grid(height, width, num_cols, scale):
+    cell_width = width / num_cols
+    cell_height = scale * cell_width
+    num_rows = int(height / cell_height)
+    if num_cols > width or num_rows > height:
+        print("Too many columns or rows. Use default setting", file=sys.stderr)
+        cell_width = 6
+        cell_height = 12
+        num_cols = int(width / cell_width)
+        num_rows = int(height / cell_height)
+    return cell_width, cell_height, num_cols, num_rows
+
+
+def get_edges(height, width, cell_width, cell_height, num_cols, num_rows):
+    row_starts, row_ends = cell_edges(height, cell_height, num_rows)
+    col_starts, col_ends = cell_edges(width, cell_width, num_cols)
+    return row_starts, row_ends, col_starts, col_ends
+
+
+def cell_counts(edges):
+    row_starts, row_ends, col_starts, col_ends = edges
+    return np.outer(row_ends - row_starts, col_ends - col_starts)
+
+
+def reduce_cells(image, edges):
+    row_starts, row_ends, col_starts, col_ends = edges
+    # Cells are contiguous, so a single reduceat per axis sums every cell at once
+    image = image[:row_ends[-1], :col_ends[-1]]
+    sums = np.add.reduceat(image, row_starts, axis=0, dtype=np.int64)
+    return np.add.reduceat(sums, col_starts, axis=1, dtype=np.int64)
+
+
+def sums_to_means(sums, counts):
+    if sums.ndim == 3:
+        # Mean over every channel of the cell, as np.mean(partial_image) did
+        return sums.sum(axis=2) / (counts * sums.shape[2])
+    return sums / counts
+
+
+def sums_to_colors(sums, cell_width, cell_height):
+    # Normalized by the nominal cell area rather than the pixel count, like the original color scripts
+    return (sums / (cell_height * cell_width)).astype(np.int32)
+
+
+def cell_sums(image, cell_width, cell_height, num_cols, num_rows):
+    edges = get_edges(image.shape[0], image.shape[1], cell_width, cell_height, num_cols, num_rows)
+    return reduce_cells(image, edges), cell_counts(edges)
+
+
+def cell_means(image, cell_width, cell_height, num_cols, num_rows):
+    sums, counts = cell_sums(image, cell_width, cell_height, num_cols, num_rows)
+    return sums_to_means(sums, counts)
+
+
+def cell_colors(image, cell_width, cell_height, num_cols, num_rows):
+    sums, counts = cell_sums(image, cell_width, cell_height, num_cols, num_rows)
+    return sums_to_colors(sums, cell_width, cell_height), sums_to_means(sums, counts)
+
+
+def char_indices(means, num_chars, divide_first=False):
+    # img2img.py computed mean / 255 * num_chars and the other scripts mean * num_chars / 255, which truncate
+    # differently at the boundaries between characters
+    scaled = means / 255 * num_chars if divide_first else means * num_chars / 255
+    return np.minimum(scaled.astype(np.int64), num_chars - 1)
+
+
+def char_lut(char_list):
+    return np.array(list(char_list))
+
+
+def to_lines(indices, char_list):
+    chars = char_lut(char_list)[indices]
+    return ["".join(row) for row in chars]
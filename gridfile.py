@@ -0,0 +1,154 @@
+"""
+Compact intermediate format of character grids, so that one analysis of an image or a video feeds any number of
+renders (text, grayscale or color image, HTML, video) without converting the source again.
+
+A grid file holds a fixed header (magic, version, metadata size, number of frames), JSON metadata (character
+list, ramp levels, font and cell geometry, source size, frame rate) and, from a 64-byte aligned offset, one
+fixed-size record per frame: the character indices, uint8 or uint16 for alphabets of more than 256 characters,
+followed by the uint8 RGB cell colors when the grid has them. Records are memory-mapped as a numpy structured
+array, so frame k of a video grid is read without touching the others.
+"""
+import html
+import json
+import struct
+
+import numpy as np
+from converter import Converter
+from grid import char_lut
+
+MAGIC = b"ASCIIGRD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+ALIGNMENT = 64
+
+
+def grid_metadata(converter, source_shape, num_rows, fps=None):
+    """Metadata of the grids of a Converter, for a source image or video frames of `source_shape`"""
+    return {"language": converter.language, "mode": converter.mode, "ramp": converter.ramp,
+            "char_list": converter.char_list,
+            "levels": None if converter.levels is None else [float(level) for level in converter.levels],
+            "font_size": converter.font_size, "scale": converter.scale, "num_cols": converter.num_cols,
+            "num_rows": num_rows, "width": source_shape[1], "height": source_shape[0],
+            "background": "white" if np.any(converter.background) else "black", "colors": converter.color,
+            "fps": fps}
+
+
+def record_dtype(meta):
+    shape = (meta["num_rows"], meta["num_cols"])
+    fields = [("indices", np.uint8 if len(meta["char_list"]) <= 256 else np.uint16, shape)]
+    if meta["colors"]:
+        fields.append(("colors", np.uint8, shape + (3,)))
+    return np.dtype(fields)
+
+
+def data_offset(meta_size):
+    return -(-(HEADER.size + meta_size) // ALIGNMENT) * ALIGNMENT
+
+
+class GridWriter(object):
+    """Appends frames to a grid file; the frame count in the header is written on close"""
+
+    def __init__(self, path, meta):
+        self.meta = meta
+        self.dtype = record_dtype(meta)
+        encoded = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(encoded), 0) + encoded)
+        self.file.write(b"\0" * (data_offset(len(encoded)) - HEADER.size - len(encoded)))
+        self.meta_size = len(encoded)
+        self.num_frames = 0
+
+    def write(self, indices, colors=None):
+        """Append one frame: its index grid and, for grids with colors, its BGR cell colors as the converters
+        return them"""
+        if indices.shape != self.dtype["indices"].shape:
+            raise ValueError("Grid of shape {} in a file of {} grids".format(indices.shape,
+                                                                             self.dtype["indices"].shape))
+        self.file.write(np.ascontiguousarray(indices, dtype=self.dtype["indices"].base).tobytes())
+        if "colors" in self.dtype.names:
+            # Truncated like the renderer truncates colors, so renders from the file match direct renders
+            rgb = np.clip(colors[:, :, ::-1], 0, 255).astype(np.uint8)
+            self.file.write(rgb.tobytes())
+        self.num_frames += 1
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.meta_size, self.num_frames))
+        self.file.close()
+
+
+class CharGrid(object):
+    """A grid file opened read-only: `meta`, plus (frames, rows, cols) memory-mapped `indices` and
+    (frames, rows, cols, 3) RGB `colors` (None for grids without colors)"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, meta_size, num_frames = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("{} is not a grid file".format(path))
+            if version > VERSION:
+                raise ValueError("Grid file version {} is not supported".format(version))
+            self.meta = json.loads(f.read(meta_size).decode("utf-8"))
+        self.records = np.memmap(path, dtype=record_dtype(self.meta), mode="r", offset=data_offset(meta_size),
+                                 shape=(num_frames,)) if num_frames else np.empty(0, dtype=record_dtype(self.meta))
+        self.indices = self.records["indices"]
+        self.colors = self.records["colors"] if self.meta["colors"] else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def frame(self, index):
+        """Return the indices and BGR colors (None without colors) of a frame, as the converters return them"""
+        colors = None if self.colors is None else self.colors[index][:, :, ::-1]
+        return self.indices[index], colors
+
+
+def open_grid(path):
+    return CharGrid(path)
+
+
+def save_grid(path, converter, source_shape, indices, colors=None):
+    """Write the single grid analyze() returned for an image"""
+    writer = GridWriter(path, grid_metadata(converter, source_shape, indices.shape[0]))
+    writer.write(indices, colors)
+    writer.close()
+
+
+def add_grid_args(parser, frames=False):
+    """Add the scripts' --save_grid option to a parser, saving the grid of every frame if `frames`"""
+    grid = "character grid of every frame" if frames else "character grid"
+    parser.add_argument("--save_grid", type=str, default=None,
+                        help="Path to also save the {}, rendered again later with render_grid.py".format(grid))
+
+
+def grid_converter(meta, background=None, color=False):
+    """Converter rendering the grids of a file, with the file's background unless another one is given"""
+    return Converter(meta["language"], meta["mode"], meta["num_cols"], background or meta["background"], color,
+                     font_size=meta["font_size"], char_list=meta["char_list"])
+
+
+def to_text(meta, indices):
+    return "".join("".join(row) + "\n" for row in char_lut(meta["char_list"])[indices])
+
+
+def to_html(meta, indices, colors=None, background=None):
+    """Standalone HTML page of a grid in a <pre> block, one span per run of cells of the same RGB color"""
+    chars = char_lut(meta["char_list"])[indices]
+    white = (background or meta["background"]) == "white"
+    rows = []
+    for r in range(len(chars)):
+        if colors is None:
+            rows.append(html.escape("".join(chars[r])))
+            continue
+        codes = ["#{:02x}{:02x}{:02x}".format(*color) for color in colors[r]]
+        parts = []
+        start = 0
+        for c in range(1, len(codes) + 1):
+            if c == len(codes) or codes[c] != codes[start]:
+                parts.append('<span style="color:{}">{}</span>'.format(codes[start],
+                                                                        html.escape("".join(chars[r, start:c]))))
+                start = c
+        rows.append("".join(parts))
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"></head>\n<body style="background:{};color:{}">'
+            '<pre style="font-family:monospace;line-height:1">\n{}\n</pre></body></html>\n').format(
+        "#fff" if white else "#000", "#000" if white else "#fff", "\n".join(rows))
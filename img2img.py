@@ -2,13 +2,13 @@
 @author: Viet Nguyen <nhviet1009@gmail.com>
 """
 import argparse
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageOps
-from utils import get_data
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs, read_image
+from gridfile import save_grid, add_grid_args
+from tiles import convert_tiled
 
 
-def get_args():
+def get_args(argv=None):
     parser = argparse.ArgumentParser("Image to ASCII")
     parser.add_argument("--input", type=str, default="data/input.jpg", help="Path to input image")
     parser.add_argument("--output", type=str, default="data/output.jpg", help="Path to output text file")
@@ -17,49 +17,36 @@ def get_args():
     parser.add_argument("--background", type=str, default="black", choices=["black", "white"],
                         help="background's color")
     parser.add_argument("--num_cols", type=int, default=300, help="number of character for output's width")
-    args = parser.parse_args()
+    parser.add_argument("--tiled", action="store_true",
+                        help="convert in bands to bound memory, writing .png, .pgm/.ppm or .npy")
+    parser.add_argument("--band_rows", type=int, default=64, help="rows of characters per band in tiled mode")
+    add_mapping_args(parser)
+    add_grid_args(parser)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
     return args
 
 
 def main(opt):
-    if opt.background == "white":
-        bg_code = 255
+    profiling.start(opt)
+    converter = Converter(opt.language, opt.mode, opt.num_cols, opt.background, divide_first=True,
+                          **mapping_kwargs(opt))
+    if opt.tiled:
+        if opt.save_grid:
+            print("Saving the grid is not available in tiled mode")
+            return
+        convert_tiled(converter, opt.input, opt.output, opt.band_rows)
     else:
-        bg_code = 0
-    char_list, font, sample_character, scale = get_data(opt.language, opt.mode)
-    num_chars = len(char_list)
-    num_cols = opt.num_cols
-    image = cv2.imread(opt.input)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    height, width = image.shape
-    cell_width = width / opt.num_cols
-    cell_height = scale * cell_width
-    num_rows = int(height / cell_height)
-    if num_cols > width or num_rows > height:
-        print("Too many columns or rows. Use default setting")
-        cell_width = 6
-        cell_height = 12
-        num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
-    char_width, char_height = font.getsize(sample_character)
-    out_width = char_width * num_cols
-    out_height = scale * char_height * num_rows
-    out_image = Image.new("L", (out_width, out_height), bg_code)
-    draw = ImageDraw.Draw(out_image)
-    for i in range(num_rows):
-        line = "".join([char_list[min(int(np.mean(image[int(i * cell_height):min(int((i + 1) * cell_height), height),
-                                                  int(j * cell_width):min(int((j + 1) * cell_width),
-                                                                          width)]) / 255 * num_chars), num_chars - 1)]
-                        for j in
-                        range(num_cols)]) + "\n"
-        draw.text((0, i * char_height), line, fill=255 - bg_code, font=font)
-
-    if opt.background == "white":
-        cropped_image = ImageOps.invert(out_image).getbbox()
-    else:
-        cropped_image = out_image.getbbox()
-    out_image = out_image.crop(cropped_image)
-    out_image.save(opt.output)
+        with profiling.stage("decode"):
+            image = read_image(opt.input)
+        cells = None
+        if opt.save_grid:
+            cells = converter.analyze(image)
+            save_grid(opt.save_grid, converter, image.shape, *cells)
+        out_image = converter.to_pil(image, cells)
+        with profiling.stage("encode"):
+            out_image.save(opt.output)
+    profiling.finish(opt)
 
 
 if __name__ == '__main__':
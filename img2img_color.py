@@ -3,13 +3,13 @@
 """
 import argparse
 
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageOps
-from utils import get_data
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs, read_image
+from gridfile import save_grid, add_grid_args
+from tiles import convert_tiled
 
 
-def get_args():
+def get_args(argv=None):
     parser = argparse.ArgumentParser("Image to ASCII")
     parser.add_argument("--input", type=str, default="data/input.jpg", help="Path to input image")
     parser.add_argument("--output", type=str, default="data/output.jpg", help="Path to output text file")
@@ -19,50 +19,46 @@ def get_args():
                         help="background's color")
     parser.add_argument("--num_cols", type=int, default=300, help="number of character for output's width")
     parser.add_argument("--scale", type=int, default=2, help="upsize output")
-    args = parser.parse_args()
+    parser.add_argument("--palette", type=int, default=0,
+                        help="number of colors of an indexed PNG output, 0 for full color")
+    parser.add_argument("--tiled", action="store_true",
+                        help="convert in bands to bound memory, writing .png, .pgm/.ppm or .npy")
+    parser.add_argument("--band_rows", type=int, default=64, help="rows of characters per band in tiled mode")
+    add_mapping_args(parser)
+    add_grid_args(parser)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
     return args
 
 
 def main(opt):
-    if opt.background == "white":
-        bg_code = (255, 255, 255)
+    profiling.start(opt)
+    if opt.palette and not opt.output.lower().endswith(".png"):
+        print("Palette output is an indexed PNG, use an output path ending in .png")
+        return
+    converter = Converter(opt.language, opt.mode, opt.num_cols, opt.background, color=True, **mapping_kwargs(opt))
+    if opt.tiled:
+        if opt.palette:
+            print("Palette mode is not available in tiled mode")
+            return
+        if opt.save_grid:
+            print("Saving the grid is not available in tiled mode")
+            return
+        convert_tiled(converter, opt.input, opt.output, opt.band_rows)
     else:
-        bg_code = (0, 0, 0)
-    char_list, font, sample_character, scale = get_data(opt.language, opt.mode)
-    num_chars = len(char_list)
-    num_cols = opt.num_cols
-    image = cv2.imread(opt.input, cv2.IMREAD_COLOR)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    height, width, _ = image.shape
-    cell_width = width / opt.num_cols
-    cell_height = scale * cell_width
-    num_rows = int(height / cell_height)
-    if num_cols > width or num_rows > height:
-        print("Too many columns or rows. Use default setting")
-        cell_width = 6
-        cell_height = 12
-        num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
-    char_width, char_height = font.getsize(sample_character)
-    out_width = char_width * num_cols
-    out_height = scale * char_height * num_rows
-    out_image = Image.new("RGB", (out_width, out_height), bg_code)
-    draw = ImageDraw.Draw(out_image)
-    for i in range(num_rows):
-        for j in range(num_cols):
-            partial_image = image[int(i * cell_height):min(int((i + 1) * cell_height), height),
-                            int(j * cell_width):min(int((j + 1) * cell_width), width), :]
-            partial_avg_color = np.sum(np.sum(partial_image, axis=0), axis=0) / (cell_height * cell_width)
-            partial_avg_color = tuple(partial_avg_color.astype(np.int32).tolist())
-            char = char_list[min(int(np.mean(partial_image) * num_chars / 255), num_chars - 1)]
-            draw.text((j * char_width, i * char_height), char, fill=partial_avg_color, font=font)
-
-    if opt.background == "white":
-        cropped_image = ImageOps.invert(out_image).getbbox()
-    else:
-        cropped_image = out_image.getbbox()
-    out_image = out_image.crop(cropped_image)
-    out_image.save(opt.output)
+        with profiling.stage("decode"):
+            image = read_image(opt.input)
+        cells = None
+        if opt.save_grid:
+            cells = converter.analyze(image)
+            save_grid(opt.save_grid, converter, image.shape, *cells)
+        if opt.palette:
+            out_image = converter.to_palette(image, opt.palette, cells)
+        else:
+            out_image = converter.to_pil(image, cells)
+        with profiling.stage("encode"):
+            out_image.save(opt.output)
+    profiling.finish(opt)
 
 
 if __name__ == '__main__':
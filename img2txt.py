@@ -2,51 +2,50 @@
 @author: Viet Nguyen <nhviet1009@gmail.com>
 """
 import argparse
+import sys
 
-import cv2
-import numpy as np
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs, read_image
+from grid import char_lut
+from gridfile import save_grid, add_grid_args
 
 
-def get_args():
+def get_args(argv=None):
     parser = argparse.ArgumentParser("Image to ASCII")
     parser.add_argument("--input", type=str, default="data/input.jpg", help="Path to input image")
-    parser.add_argument("--output", type=str, default="data/output.txt", help="Path to output text file")
+    parser.add_argument("--output", type=str, default="data/output.txt", help="Path to output text file, - for stdout")
     parser.add_argument("--mode", type=str, default="complex", choices=["simple", "complex"],
                         help="10 or 70 different characters")
     parser.add_argument("--num_cols", type=int, default=150, help="number of character for output's width")
-    args = parser.parse_args()
+    add_mapping_args(parser)
+    add_grid_args(parser)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
     return args
 
 
 def main(opt):
-    if opt.mode == "simple":
-        CHAR_LIST = '@%#*+=-:. '
+    profiling.start(opt)
+    with profiling.stage("decode"):
+        image = read_image(opt.input)
+    converter = Converter("general", opt.mode, opt.num_cols, **mapping_kwargs(opt))
+
+    # Rows are written as soon as they are computed, through a large buffer
+    if opt.output == "-":
+        output_file = open(sys.stdout.fileno(), 'w', buffering=1 << 16, closefd=False)
     else:
-        CHAR_LIST = "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\|()1{}[]?-_+~<>i!lI;:,\"^`'. "
-    num_chars = len(CHAR_LIST)
-    num_cols = opt.num_cols
-    image = cv2.imread(opt.input)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    height, width = image.shape
-    cell_width = width / opt.num_cols
-    cell_height = 2 * cell_width
-    num_rows = int(height / cell_height)
-    if num_cols > width or num_rows > height:
-        print("Too many columns or rows. Use default setting")
-        cell_width = 6
-        cell_height = 12
-        num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
-
-    output_file = open(opt.output, 'w')
-    for i in range(num_rows):
-        for j in range(num_cols):
-            output_file.write(
-                CHAR_LIST[min(int(np.mean(image[int(i * cell_height):min(int((i + 1) * cell_height), height),
-                                          int(j * cell_width):min(int((j + 1) * cell_width),
-                                                                  width)]) * num_chars / 255), num_chars - 1)])
-        output_file.write("\n")
+        output_file = open(opt.output, 'w', buffering=1 << 20)
+    if opt.save_grid:
+        # The grid is analyzed whole, once, for both outputs
+        indices, _ = converter.analyze(image)
+        save_grid(opt.save_grid, converter, image.shape, indices)
+        lines = ("".join(row) for row in char_lut(converter.char_list)[indices])
+    else:
+        lines = converter.iter_lines(image)
+    for line in lines:
+        output_file.write(line + "\n")
     output_file.close()
+    profiling.finish(opt, file=sys.stderr)
 
 
 if __name__ == '__main__':
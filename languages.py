@@ -0,0 +1,34 @@
+"""
+Registry of the supported languages: the alphabet of each one in alphabets.py, the font drawing it and the
+geometry of its character cells. Adding a language is a matter of adding its alphabet and an entry here.
+"""
+from collections import namedtuple
+
+# `alphabet` names the dict of modes in alphabets.py. `scale` is the cell height over the cell width. Sorted
+# languages have ramps already ordered from most to least ink, the others are sorted by measuring their glyphs
+# in a line of `measure_character` cells.
+Language = namedtuple("Language", ["alphabet", "font_path", "font_size", "sample_character", "scale", "sorted",
+                                   "measure_character"])
+
+LATIN_FONT = "fonts/DejaVuSansMono-Bold.ttf"
+
+LANGUAGES = {
+    "general": Language("GENERAL", LATIN_FONT, 20, "A", 2, True, None),
+    "english": Language("ENGLISH", LATIN_FONT, 20, "A", 2, False, "A"),
+    "german": Language("GERMAN", LATIN_FONT, 20, "A", 2, False, "A"),
+    "french": Language("FRENCH", LATIN_FONT, 20, "A", 2, False, "A"),
+    "italian": Language("ITALIAN", LATIN_FONT, 20, "A", 2, False, "A"),
+    "polish": Language("POLISH", LATIN_FONT, 20, "A", 2, False, "A"),
+    "portuguese": Language("PORTUGUESE", LATIN_FONT, 20, "A", 2, False, "A"),
+    "spanish": Language("SPANISH", LATIN_FONT, 20, "A", 2, False, "A"),
+    "russian": Language("RUSSIAN", LATIN_FONT, 20, "Ш", 2, False, "A"),
+    "chinese": Language("CHINESE", "fonts/simsun.ttc", 10, "制", 1, False, "制"),
+    "korean": Language("KOREAN", "fonts/arial-unicode.ttf", 10, "ㅊ", 1, False, "ㅊ"),
+    "japanese": Language("JAPANESE", "fonts/arial-unicode.ttf", 10, "お", 1, False, "あ"),
+}
+
+
+def get_alphabet(language):
+    """Return the dict of modes of a registered language"""
+    import alphabets
+    return getattr(alphabets, LANGUAGES[language].alphabet)
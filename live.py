@@ -0,0 +1,227 @@
+"""
+Live ASCII art of a camera, a stream or a synthetic test pattern, in a window, the terminal or a recording.
+
+The newest captured frame is always the one converted, stale frames are dropped, and the number of columns is
+lowered whenever converting a frame takes longer than the latency budget (and raised back when there is room).
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs
+from grid import char_lut
+from pipeline import LatestFrame
+from terminal import TextScreen, color_codes, format_rows
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Live ASCII")
+    parser.add_argument("--input", type=str, default="0",
+                        help="camera index, path or URL of any OpenCV capture, or test for a synthetic pattern")
+    parser.add_argument("--display", type=str, default="window", choices=["window", "terminal", "none"],
+                        help="OpenCV window, text in the terminal, or nothing (with --output or to measure)")
+    parser.add_argument("--output", type=str, default=None, help="Path to a video recording of the images shown")
+    parser.add_argument("--mode", type=str, default="simple", choices=["simple", "complex"],
+                        help="10 or 70 different characters")
+    parser.add_argument("--background", type=str, default="black", choices=["black", "white"],
+                        help="background's color")
+    parser.add_argument("--color", action="store_true", help="color characters")
+    parser.add_argument("--num_cols", type=int, default=100, help="largest number of character for output's width")
+    parser.add_argument("--min_cols", type=int, default=20, help="fewest columns the budget may lower num_cols to")
+    parser.add_argument("--latency_budget", type=float, default=40,
+                        help="milliseconds a frame may take to convert and render, 0 to keep num_cols fixed")
+    parser.add_argument("--scale", type=int, default=1, help="upsize output")
+    parser.add_argument("--width", type=int, default=640, help="width of the test pattern")
+    parser.add_argument("--height", type=int, default=480, help="height of the test pattern")
+    parser.add_argument("--fps", type=float, default=30,
+                        help="frame rate of the test pattern, and of video files, played as if they were live")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run, 0 until the input ends or q")
+    add_mapping_args(parser, shape=False)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
+    return args
+
+
+class TestPattern(object):
+    """Synthetic capture with the VideoCapture interface: moving gradients, a bouncing disc and a frame counter"""
+
+    def __init__(self, width, height, fps):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.index = 0
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        self.base = np.stack(np.broadcast_arrays(x + 0 * y, y + 0 * x, (x + y) / 2), axis=-1)
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_WIDTH: self.width,
+                cv2.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0)
+
+    def read(self):
+        t = self.index / self.fps
+        self.index += 1
+        frame = np.roll(self.base, int(40 * t) % self.width, axis=1).astype(np.uint8)
+        radius = min(self.width, self.height) // 6
+        center = (int((self.width - 2 * radius) * (0.5 + 0.5 * np.sin(1.3 * t))) + radius,
+                  int((self.height - 2 * radius) * (0.5 + 0.5 * np.cos(0.9 * t))) + radius)
+        cv2.circle(frame, center, radius, (255, 255, 255), -1)
+        cv2.putText(frame, str(self.index), (10, self.height - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                    self.height / 160, (0, 0, 0), max(self.height // 80, 1))
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def open_capture(opt):
+    """Return the capture of --input and the rate its frames are released at, 0 for sources that are live"""
+    if opt.input == "test":
+        return TestPattern(opt.width, opt.height, opt.fps), opt.fps
+    if opt.input.isdigit():
+        return cv2.VideoCapture(int(opt.input)), 0
+    cap = cv2.VideoCapture(opt.input)
+    # Files decode faster than real time; streams report no frame count and pace themselves
+    is_file = cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+    return cap, (cap.get(cv2.CAP_PROP_FPS) or opt.fps) if is_file else 0
+
+
+class ColumnBudget(object):
+    """Keeps the smoothed frame time under a budget by scaling the number of columns, whose cost grows with
+    the number of cells, i.e. the square of the columns"""
+
+    def __init__(self, num_cols, min_cols, budget, smoothing=0.2, settle=10):
+        self.max_cols = num_cols
+        self.min_cols = min(min_cols, num_cols)
+        self.budget = budget
+        self.smoothing = smoothing
+        self.settle = settle
+        self.num_cols = num_cols
+        self.average = None
+        self.count = 0
+
+    def update(self, duration):
+        """Account for the time of a frame and return the number of columns of the next one"""
+        self.average = duration if self.average is None else \
+            self.average + self.smoothing * (duration - self.average)
+        self.count += 1
+        if not self.budget or self.count < self.settle:
+            return self.num_cols
+        ratio = self.budget / self.average
+        if ratio < 1:
+            num_cols = max(int(self.num_cols * 0.95 * ratio ** 0.5), self.min_cols)
+        elif ratio > 2 and self.num_cols < self.max_cols:
+            num_cols = min(int(self.num_cols * 1.1) + 1, self.max_cols)
+        else:
+            return self.num_cols
+        if num_cols != self.num_cols:
+            # Measure the new size from scratch before changing it again
+            self.num_cols = num_cols
+            self.average = None
+            self.count = 0
+        return self.num_cols
+
+
+def main(opt):
+    profiling.start(opt)
+    cap, pace = open_capture(opt)
+    if not cap.isOpened():
+        print("Cannot open {}".format(opt.input))
+        return
+    if opt.display == "window":
+        try:
+            cv2.namedWindow("Live ASCII")
+        except cv2.error:
+            print("This OpenCV build has no window support, use --display terminal or none")
+            cap.release()
+            return
+    converter = Converter("general", opt.mode, opt.num_cols, opt.background, color=opt.color,
+                          font_size=int(10 * opt.scale), **mapping_kwargs(opt))
+    lut = char_lut(converter.char_list)
+    budget = ColumnBudget(opt.num_cols, opt.min_cols, opt.latency_budget / 1000)
+    screen = TextScreen(sys.stdout) if opt.display == "terminal" else None
+    grabber = LatestFrame(cap, pace)
+    plan = plan_cols = None
+    out = size = None
+    latencies = []
+    num_dropped = 0
+    start = time.monotonic()
+    last_status = start
+    try:
+        while not opt.duration or time.monotonic() - start < opt.duration:
+            item = grabber.get()
+            if item is None:
+                break
+            frame, captured, dropped = item
+            num_dropped += dropped
+            began = time.monotonic()
+            if plan is None or plan_cols != converter.num_cols:
+                plan = converter.plan(frame)
+                plan_cols = converter.num_cols
+                if screen is not None and screen.rows is not None:
+                    # Fewer columns leave the ends of the longer rows on screen, so start from a cleared one
+                    screen = TextScreen(sys.stdout)
+            with profiling.stage("frame"):
+                indices, colors = converter.frame_cells(frame, plan)
+                if screen is not None:
+                    codes = None if colors is None else color_codes(colors[:, :, ::-1], "truecolor")
+                    screen.draw(format_rows(lut[indices], codes))
+                else:
+                    out_image = converter.render_cells(indices, colors, frame, plan)
+            # Only the conversion scales with the columns, so it alone is held to the budget
+            converter.num_cols = budget.update(time.monotonic() - began)
+            if screen is None:
+                if out is None and opt.output:
+                    from writers import open_video_writer
+                    # The recording keeps the size of its first frame whatever the columns become
+                    size = (out_image.shape[1], out_image.shape[0])
+                    out = open_video_writer("cv2", opt.output, size[0], size[1], 3, pace or opt.fps)
+                if out is not None:
+                    with profiling.stage("write"):
+                        out.write(out_image if out_image.shape[1::-1] == size else
+                                  cv2.resize(out_image, size, interpolation=cv2.INTER_AREA))
+                if opt.display == "window":
+                    cv2.imshow("Live ASCII", out_image)
+                    if cv2.waitKey(1) & 0xFF in (ord("q"), 27):
+                        break
+            done = time.monotonic()
+            latencies.append(done - captured)
+            if profiling.enabled():
+                profiling.record("end_to_end", captured, done - captured)
+            if screen is None and done - last_status >= 1:
+                last_status = done
+                recent = latencies[-int(max(pace, 10)):]
+                print("\r{:5.1f} fps, latency {:5.1f} ms, {} columns, {} dropped".format(
+                    len(latencies) / (done - start), 1000 * sum(recent) / len(recent), plan.num_cols, num_dropped),
+                    end="", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        grabber.stop()
+        cap.release()
+        if out is not None:
+            out.close()
+        if screen is not None:
+            screen.close()
+        if opt.display == "window":
+            cv2.destroyAllWindows()
+    elapsed = time.monotonic() - start
+    if latencies:
+        latencies.sort()
+        print("\nShown {} frames in {:.1f} s ({:.1f} fps), dropped {}, latency mean {:.1f} ms, p95 {:.1f} ms, "
+              "{} columns at the end".format(len(latencies), elapsed, len(latencies) / elapsed, num_dropped,
+                                             1000 * sum(latencies) / len(latencies),
+                                             1000 * latencies[int(0.95 * (len(latencies) - 1))], plan.num_cols),
+              file=sys.stderr)
+    profiling.finish(opt, "end_to_end", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import profiling
+
+# Samples further apart than this many frames are reached by seeking rather than by grabbing every frame between
+SEEK_STEP = 48
+
+
+def sample_range(cap, start=0, end=0, every_nth=1, target_fps=0):
+    """Return the frame numbers (first, stop, step) sampling a time range in seconds of a cv2.VideoCapture.
+
+    `stop` is None when the range runs to the end of the video, and is never past the number of frames the video
+    reports. The step is every_nth, or the one closest to target_fps when given.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if (start or end or target_fps) and fps <= 0:
+        raise ValueError("The video has no frame rate, so it cannot be sampled by time")
+    first = int(round(start * fps)) if start else 0
+    stop = int(round(end * fps)) if end else None
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if stop is not None and num_frames > 0:
+        stop = min(stop, num_frames)
+    step = max(int(round(fps / target_fps)), 1) if target_fps else max(every_nth, 1)
+    return first, stop, step
+
+
+def split_frames(first, stop, step, num_segments):
+    """Split the sampled frames first, first + step, ... before stop into up to num_segments (first, stop) ranges"""
+    num_samples = max(-(-(stop - first) // step), 0)
+    bounds = [first + step * (num_samples * i // num_segments) for i in range(num_segments + 1)]
+    bounds[-1] = stop
+    return [(low, high) for low, high in zip(bounds, bounds[1:]) if high > low]
+
+
+def read_frames(cap, queue_depth, first=0, stop=None, step=1):
+    """Yield the frames of a cv2.VideoCapture, decoded ahead by a background thread into a bounded queue.
+
+    Only frames first, first + step, ... before stop are yielded; the frames in between are grabbed without being
+    converted, or skipped with a seek when they are many.
+    """
+    frames = queue.Queue(maxsize=max(queue_depth, 1))
+
+    def decode():
+        position = first
+        if first:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        while cap.isOpened() and (stop is None or position < stop):
+            with profiling.stage("decode"):
+                flag, frame = cap.read()
+                if flag and step > SEEK_STEP:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, position + step)
+                elif flag:
+                    for _ in range(step - 1):
+                        cap.grab()
+            if not flag:
+                break
+            frames.put(frame)
+            position += step
+        frames.put(None)
+
+    thread = threading.Thread(target=decode, daemon=True)
+    thread.start()
+    while True:
+        frame = frames.get()
+        if frame is None:
+            break
+        yield frame
+    thread.join()
+
+
+class LatestFrame(object):
+    """Reads a capture on a background thread and keeps only its most recent frame.
+
+    A consumer slower than the source gets the freshest frame every time instead of a growing backlog; the
+    frames it had no time for are counted as dropped. With `fps`, frames are released at that rate, so that a
+    video file plays like a live source.
+    """
+
+    def __init__(self, cap, fps=0):
+        self.cap = cap
+        self.fps = fps
+        self.condition = threading.Condition()
+        self.frame = None
+        self.captured = None
+        self.count = 0
+        self.taken = 0
+        self.done = False
+        self.thread = threading.Thread(target=self.capture, daemon=True)
+        self.thread.start()
+
+    def capture(self):
+        start = time.monotonic()
+        while not self.done:
+            flag, frame = self.cap.read()
+            if flag and self.fps:
+                time.sleep(max(start + self.count / self.fps - time.monotonic(), 0))
+            with self.condition:
+                if not flag:
+                    self.done = True
+                else:
+                    self.frame, self.captured = frame, time.monotonic()
+                    self.count += 1
+                self.condition.notify_all()
+
+    def get(self):
+        """Return (frame, capture time, number of frames dropped since the previous call), or None once the
+        capture has ended"""
+        with self.condition:
+            while self.count == self.taken and not self.done:
+                self.condition.wait()
+            if self.count == self.taken:
+                return None
+            dropped = self.count - self.taken - 1
+            self.taken = self.count
+            return self.frame, self.captured, dropped
+
+    def stop(self):
+        with self.condition:
+            self.done = True
+        self.thread.join()
+
+
+def map_frames(convert, frames, workers, queue_depth, initializer=None, initargs=()):
+    """Yield convert(frame) for every frame in input order.
+
+    With more than one worker, frames are converted by a process pool whose workers run `initializer` once, and
+    at most workers + queue_depth frames are in flight at any time, whatever the length of the video.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for frame in frames:
+            yield convert(frame)
+        return
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for frame in frames:
+            pending.append(executor.submit(convert, frame))
+            if len(pending) >= workers + queue_depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,171 @@
+import cv2
+import numpy as np
+import profiling
+from grid import get_grid, get_edges, cell_counts, reduce_cells, sums_to_means, sums_to_colors
+
+
+def content_box(image, background):
+    """Bounding box (left, top, right, bottom) of everything that differs from the background, like getbbox"""
+    if image.ndim == 3:
+        content = (image != np.array(background)).any(axis=2)
+    else:
+        content = image != background
+    rows = np.nonzero(content.any(axis=1))[0]
+    cols = np.nonzero(content.any(axis=0))[0]
+    if not len(rows):
+        return None
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+
+class RenderPlan(object):
+    """Geometry of a video stream, computed once from its first frame and reused for every frame.
+
+    The plan holds the cell boundaries, the output canvas size, the crop box and the overlay rectangle, plus
+    work buffers that are overwritten in place frame after frame. Buffers are not pickled, so a plan can be
+    handed to worker processes which allocate their own.
+
+    Output frames rotate through `num_frames` buffers, so a returned frame stays valid while the next
+    num_frames - 1 ones are rendered, e.g. while it waits in the queue of a writer thread. Grayscale renders
+    come out as single-channel frames if `gray`, with the overlay converted to gray.
+    """
+
+    def __init__(self, frame_shape, num_cols, scale, char_size, background, overlay_ratio, incremental=False,
+                 threshold=0, gray=False, num_frames=1):
+        height, width = frame_shape[:2]
+        char_width, char_height = char_size
+        self.cell_width, self.cell_height, self.num_cols, self.num_rows = get_grid(height, width, num_cols, scale)
+        self.edges = get_edges(height, width, self.cell_width, self.cell_height, self.num_cols, self.num_rows)
+        self.counts = cell_counts(self.edges)
+        self.out_width = char_width * self.num_cols
+        self.out_height = scale * char_height * self.num_rows
+        self.background = background
+        self.overlay_ratio = overlay_ratio
+        self.crop_box = None
+        self.overlay_box = None
+        self.sub_edges = None
+        self.buffers = {}
+        self.gray = gray
+        self.num_frames = num_frames
+        self.frame_count = 0
+        # Incremental rendering keeps the last grid drawn on the canvas and only redraws the cells that changed
+        self.incremental = incremental
+        self.threshold = threshold
+        self.previous = None
+        self.reference = None
+        self.reused = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["buffers"] = {}
+        state["previous"] = None
+        state["reference"] = None
+        # Worker processes hand every frame back pickled, so one output buffer is enough there
+        state["num_frames"] = 1
+        return state
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        if name not in self.buffers:
+            self.buffers[name] = np.empty(shape, dtype=dtype)
+        return self.buffers[name]
+
+    def to_gray(self, frame):
+        """Grayscale version of a BGR, BGRA or grayscale frame, converted into a reused buffer"""
+        if frame.ndim == 2:
+            return frame
+        code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code, dst=self.buffer("gray", frame.shape[:2]))
+
+    def gray_indices(self, frame, map_cells):
+        with profiling.stage("grid"):
+            image = self.to_gray(frame)
+            means = sums_to_means(reduce_cells(image, self.edges), self.counts)
+        with profiling.stage("map"):
+            return self.settle(means, map_cells(means))[0]
+
+    def color_indices(self, frame, map_cells):
+        with profiling.stage("grid"):
+            sums = reduce_cells(frame, self.edges)
+            colors = sums_to_colors(sums, self.cell_width, self.cell_height)
+            means = sums_to_means(sums, self.counts)
+        with profiling.stage("map"):
+            return self.settle(means, map_cells(means), colors)
+
+    def shape_indices(self, frame, matcher, color=False):
+        """Character indices from sub-cell shape matching, and cell colors if `color`"""
+        with profiling.stage("grid"):
+            if self.sub_edges is None:
+                self.sub_edges = matcher.edges(frame.shape[0], frame.shape[1], self.cell_width, self.cell_height,
+                                               self.num_cols, self.num_rows)
+                self.sub_counts = cell_counts(self.sub_edges)
+            image = self.to_gray(frame)
+            means = sums_to_means(reduce_cells(image, self.sub_edges), self.sub_counts)
+            colors = None
+            if color:
+                colors = sums_to_colors(reduce_cells(frame, self.edges), self.cell_width, self.cell_height)
+        with profiling.stage("map"):
+            indices = matcher.match(means, self.cell_width, self.cell_height)
+            return self.settle(matcher.cell_means(means, self.cell_width, self.cell_height), indices, colors)
+
+    def settle(self, means, indices, colors=None):
+        # Hysteresis: a cell whose luminance (and color) moved by no more than the threshold since it was last
+        # redrawn keeps its previous character and color, which suppresses flicker between neighbouring ramp steps
+        if not self.incremental or not self.threshold or self.previous is None:
+            self.reference = means
+            return indices, colors
+        stable = np.abs(means - self.reference) <= self.threshold
+        if colors is not None:
+            stable &= (np.abs(colors - self.previous["colors"]) <= self.threshold).all(axis=2)
+            colors = np.where(stable[:, :, None], self.previous["colors"], colors)
+        indices = np.where(stable, self.previous["indices"], indices)
+        self.reference = np.where(stable, self.reference, means)
+        return indices, colors
+
+    def fit(self, image):
+        self.crop_box = content_box(image, self.background) or (0, 0, self.out_width, self.out_height)
+        left, top, right, bottom = self.crop_box
+        width, height = right - left, bottom - top
+        if self.overlay_ratio:
+            overlay_width, overlay_height = int(width * self.overlay_ratio), int(height * self.overlay_ratio)
+            self.overlay_box = (width - overlay_width, height - overlay_height, width, height)
+
+    def render(self, atlas, indices, fill, frame):
+        """Render a character grid into the reused output frame, cropped and with the source overlay"""
+        channels = 0 if np.ndim(fill) == 0 else 3
+        canvas = self.buffers.get("canvas")
+        if canvas is None:
+            canvas = atlas.allocate(self.num_rows, self.num_cols, self.out_height, self.out_width, channels)
+            self.buffers["canvas"] = canvas
+        colors = fill if channels else None
+        with profiling.stage("render"):
+            if self.incremental and self.previous is not None:
+                changed = indices != self.previous["indices"]
+                if channels:
+                    changed |= (colors != self.previous["colors"]).any(axis=2)
+                block_rows, block_cols = atlas.dirty_blocks(changed, canvas)
+                atlas.compose_blocks(indices, fill, self.background, canvas, block_rows, block_cols)
+                self.reused = changed.size - np.count_nonzero(changed)
+            else:
+                atlas.compose(indices, fill, self.background, canvas)
+                self.reused = 0
+        if self.incremental:
+            self.previous = {"indices": indices, "colors": colors}
+        image = atlas.view(canvas, self.out_height, self.out_width)
+        if self.crop_box is None:
+            self.fit(image)
+        with profiling.stage("crop"):
+            left, top, right, bottom = self.crop_box
+            image = image[top:bottom, left:right]
+            gray = self.gray and not channels
+            name = "frame{}".format(self.frame_count % self.num_frames)
+            self.frame_count += 1
+            out_image = self.buffer(name, (bottom - top, right - left) + (() if gray else (3,)))
+            np.copyto(out_image, image if channels or gray else image[:, :, None], casting="unsafe")
+            if self.overlay_box is not None:
+                left, top, right, bottom = self.overlay_box
+                overlay = self.buffer("overlay", (bottom - top, right - left, 3))
+                cv2.resize(frame, (right - left, bottom - top), dst=overlay)
+                if gray:
+                    cv2.cvtColor(overlay, cv2.COLOR_BGR2GRAY, dst=out_image[top:bottom, left:right])
+                else:
+                    out_image[top:bottom, left:right] = overlay
+        return out_image
@@ -0,0 +1,217 @@
+"""
+Opt-in instrumentation of the conversion pipeline.
+
+Code wraps its stages in `with profiling.stage("name"):`. While profiling is disabled, stage() returns a shared
+no-op context manager, so instrumented code pays a single function call. Once enabled, every stage records its
+call count, total wall time and a latency histogram, optionally keeps Chrome trace events, and calls the hooks
+registered with add_hook.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+_enabled = False
+_tracing = False
+_hooks = []
+_lock = threading.Lock()
+# stage -> [calls, total seconds, {histogram bucket: calls}]
+_stats = {}
+_events = []
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+def _after_fork():
+    # A forked worker starts with an empty profile instead of a copy of its parent's, and a fresh lock
+    global _lock
+    _lock = threading.Lock()
+    _stats.clear()
+    del _events[:]
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def enable(trace=False):
+    """Start recording stages, and Chrome trace events as well if `trace`"""
+    global _enabled, _tracing
+    _enabled = True
+    _tracing = trace
+
+
+def disable():
+    global _enabled, _tracing
+    _enabled = False
+    _tracing = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        del _events[:]
+
+
+def add_hook(hook):
+    """Call hook(stage, start, duration) after every recorded stage, times in seconds from time.perf_counter"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def stage(name):
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def timed(name):
+    """Decorator recording every call of a function as a stage"""
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def bucket(duration):
+    """Histogram bucket of a duration: bucket b holds durations in [2**(b-1), 2**b) milliseconds"""
+    return max(int(math.floor(math.log2(duration * 1000))) + 1, 0) if duration > 0 else 0
+
+
+def record(name, start, duration):
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = [0, 0.0, {}]
+        stats[0] += 1
+        stats[1] += duration
+        index = bucket(duration)
+        stats[2][index] = stats[2].get(index, 0) + 1
+        if _tracing:
+            _events.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": os.getpid(),
+                            "tid": threading.get_ident()})
+    for hook in _hooks:
+        hook(name, start, duration)
+
+
+def drain():
+    """Return and clear everything recorded so far, to be merged into another process's profile"""
+    with _lock:
+        stats = {name: [calls, total, dict(histogram)] for name, (calls, total, histogram) in _stats.items()}
+        events = list(_events)
+        _stats.clear()
+        del _events[:]
+    return stats, events
+
+
+def merge(profile):
+    stats, events = profile
+    with _lock:
+        for name, (calls, total, histogram) in stats.items():
+            current = _stats.setdefault(name, [0, 0.0, {}])
+            current[0] += calls
+            current[1] += total
+            for index, count in histogram.items():
+                current[2][index] = current[2].get(index, 0) + count
+        if _tracing:
+            _events.extend(events)
+
+
+def summary():
+    """Table of calls, total and mean wall time per stage, slowest stage first"""
+    with _lock:
+        stats = sorted(_stats.items(), key=lambda item: -item[1][1])
+    lines = ["{:<16} {:>8} {:>12} {:>10}".format("stage", "calls", "total (ms)", "mean (ms)")]
+    for name, (calls, total, _) in stats:
+        lines.append("{:<16} {:>8} {:>12.1f} {:>10.3f}".format(name, calls, 1000 * total, 1000 * total / calls))
+    return "\n".join(lines)
+
+
+def histogram(name):
+    """Text histogram of the latencies of a stage, one line per power of two milliseconds"""
+    with _lock:
+        stats = _stats.get(name)
+        buckets = dict(stats[2]) if stats is not None else {}
+    if not buckets:
+        return ""
+    lines = ["{} latency".format(name)]
+    peak = max(buckets.values())
+    for index in range(min(buckets), max(buckets) + 1):
+        count = buckets.get(index, 0)
+        low = 0 if index == 0 else 2 ** (index - 1)
+        lines.append("{:>7g}-{:<7g}ms {:>7} {}".format(low, 2 ** index, count, "#" * int(round(40 * count / peak))))
+    return "\n".join(lines)
+
+
+def write(path):
+    """Dump the profile as a Chrome trace (chrome://tracing, Perfetto) with the aggregated stats as metadata"""
+    with _lock:
+        data = {"traceEvents": list(_events),
+                "stats": {name: {"calls": calls, "total": total, "histogram": histogram}
+                          for name, (calls, total, histogram) in _stats.items()}}
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def add_args(parser):
+    """Add the scripts' --profile and --profile_output options to a parser"""
+    parser.add_argument("--profile", action="store_true", help="print the time spent in every stage")
+    parser.add_argument("--profile_output", type=str, default=None, help="Path to a Chrome trace JSON of the stages")
+
+
+def start(opt):
+    """Enable profiling if the options add_args added ask for it"""
+    if opt.profile:
+        enable(trace=opt.profile_output is not None)
+
+
+def finish(opt, latency_stage=None, file=None):
+    """Report the profile if the options add_args added asked for it, as report() does"""
+    if opt.profile:
+        report(opt.profile_output, latency_stage, file)
+
+
+def report(path=None, latency_stage=None, file=None):
+    """Print the summary table (and a latency histogram), and write the trace file if a path is given"""
+    print(summary(), file=file)
+    if latency_stage is not None and histogram(latency_stage):
+        print(histogram(latency_stage), file=file)
+    if path:
+        write(path)
@@ -0,0 +1,55 @@
+"""
+Luminance to character lookup tables.
+
+A ramp is a character list ordered from most to least ink together with the luminance level (0 to 255) each
+character stands for. A 256-entry LUT maps every rounded cell luminance to the ramp character closest to it,
+after an optional tone curve (gamma, contrast) and histogram equalization.
+"""
+import numpy as np
+from charset_cache import get_coverage
+from utils import measure_coverage
+
+
+def get_ramp(char_list, font, char_width, char_height, ramp="standard"):
+    """Return (char_list, levels) for a ramp type.
+
+    "standard" keeps the character list and the evenly spaced steps of char_indices. "coverage" sorts the whole
+    alphabet by the exact fraction of its cell every glyph covers, and places each character at its own level.
+    """
+    if ramp == "standard":
+        return char_list, (np.arange(len(char_list)) + 0.5) * 255 / len(char_list)
+    coverage = np.array(get_coverage(char_list, font, char_width, char_height, measure_coverage))
+    order = np.argsort(-coverage, kind="stable")
+    coverage = coverage[order]
+    span = coverage[0] - coverage[-1]
+    if span > 0:
+        levels = 255 * (coverage[0] - coverage) / span
+    else:
+        levels = np.linspace(0, 255, len(coverage))
+    return "".join(char_list[i] for i in order), levels
+
+
+def tone_curve(gamma=1.0, contrast=1.0):
+    """Luminance curve applying a gamma, then a contrast stretch around mid gray"""
+    values = (np.arange(256) / 255) ** gamma
+    values = (values - 0.5) * contrast + 0.5
+    return np.clip(values, 0, 1) * 255
+
+
+def equalize_curve(levels):
+    """Histogram equalization curve of an array of integer luminances"""
+    cdf = np.cumsum(np.bincount(levels.ravel(), minlength=256))
+    low = cdf[cdf > 0][0]
+    if cdf[-1] == low:
+        return np.arange(256, dtype=np.float64)
+    return np.clip((cdf - low) / (cdf[-1] - low), 0, 1) * 255
+
+
+def build_lut(levels, curve):
+    """LUT of the index of the ramp level nearest to every curved luminance"""
+    edges = (levels[1:] + levels[:-1]) / 2
+    return np.searchsorted(edges, curve, side="right").astype(np.intp)
+
+
+def to_levels(means):
+    return np.clip(np.rint(means), 0, 255).astype(np.uint8)
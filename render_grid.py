@@ -0,0 +1,95 @@
+"""
+Render a grid file saved with --save_grid as text, HTML, an image or a video, without converting the source again.
+"""
+import argparse
+import os
+
+import numpy as np
+import profiling
+from gridfile import open_grid, grid_converter, to_text, to_html
+from plan import RenderPlan
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov", ".webm")
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Grid to ASCII")
+    parser.add_argument("--input", type=str, default="data/output.grid", help="Path to a grid file")
+    parser.add_argument("--output", type=str, default="data/output.png",
+                        help="Path to the output: .txt, .html, an image, or a video for grids of several frames")
+    parser.add_argument("--style", type=str, default="auto", choices=["auto", "gray", "color"],
+                        help="character colors, those of the cells when the grid has them by default")
+    parser.add_argument("--background", type=str, default=None, choices=["black", "white"],
+                        help="background's color, the one of the conversion by default")
+    parser.add_argument("--frame", type=int, default=0, help="frame rendered to text, HTML or an image")
+    parser.add_argument("--fps", type=float, default=0, help="frame per second of videos, the source's by default")
+    parser.add_argument("--writer", type=str, default="cv2", choices=["cv2", "ffmpeg", "images"],
+                        help="OpenCV VideoWriter, raw frames piped to ffmpeg, or one image per frame")
+    parser.add_argument("--codec", type=str, default=None,
+                        help="FourCC for cv2 (XVID by default) or ffmpeg encoder (libx264 by default)")
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
+    return args
+
+
+def render_video(opt, grid, converter):
+    from writers import WRITERS, open_video_writer
+    meta = grid.meta
+    plan = RenderPlan((meta["height"], meta["width"]), meta["num_cols"], meta["scale"],
+                      (converter.char_width, converter.char_height), converter.background, 0,
+                      gray=WRITERS[opt.writer].accepts_gray, num_frames=10)
+    fps = opt.fps or meta["fps"] or 25
+    out = None
+    for index in range(len(grid)):
+        indices, colors = grid.frame(index)
+        with profiling.stage("frame"):
+            out_image = plan.render(converter.atlas, indices, colors if converter.color else 255 - converter.background,
+                                    None)
+        if out is None:
+            out = open_video_writer(opt.writer, opt.output, out_image.shape[1], out_image.shape[0],
+                                    out_image.shape[2] if out_image.ndim == 3 else 0, fps, opt.codec, 8)
+        with profiling.stage("write"):
+            out.write(out_image)
+    if out is not None:
+        out.close()
+
+
+def main(opt):
+    profiling.start(opt)
+    grid = open_grid(opt.input)
+    if not len(grid):
+        print("The grid file has no frame")
+        return
+    extension = os.path.splitext(opt.output)[1].lower()
+    text_output = extension in (".txt", ".html", ".htm")
+    video_output = not text_output and len(grid) > 1 and (extension in VIDEO_EXTENSIONS or opt.writer == "images")
+    # Videos render every frame, the other outputs only --frame
+    if not video_output and not 0 <= opt.frame < len(grid):
+        print("Frame {} out of range, the grid file has {} frames".format(opt.frame, len(grid)))
+        return
+    color = opt.style == "color" or (opt.style == "auto" and grid.colors is not None)
+    if color and grid.colors is None:
+        print("The grid file has no colors")
+        return
+    if text_output:
+        indices = grid.indices[opt.frame]
+        if extension == ".txt":
+            text = to_text(grid.meta, indices)
+        else:
+            text = to_html(grid.meta, indices, grid.colors[opt.frame] if color else None, opt.background)
+        with open(opt.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    elif video_output:
+        render_video(opt, grid, grid_converter(grid.meta, opt.background, color))
+    else:
+        converter = grid_converter(grid.meta, opt.background, color)
+        indices, colors = grid.frame(opt.frame)
+        out_image = converter.to_pil(None, (np.asarray(indices), None if colors is None else np.asarray(colors)))
+        with profiling.stage("encode"):
+            out_image.save(opt.output)
+    profiling.finish(opt)
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
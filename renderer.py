@@ -0,0 +1,268 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def blend(out, mask, ink):
+    # In-place version of the integer blend PIL applies when drawing a glyph mask with a fill color,
+    # out = (out * (255 - mask) + ink * mask) / 255 rounded; every intermediate fits in uint16
+    out *= 255 - mask
+    out += np.multiply(ink, mask, dtype=np.uint16)
+    out += 128
+    out += out >> 8
+    out >>= 8
+
+
+class GlyphAtlas(object):
+    """Every glyph of a character list rasterized once, split into blocks of one character cell.
+
+    A glyph whose bounding box spills over neighbouring cells (descenders, negative bearings) occupies
+    several blocks, so a whole canvas is composed with one vectorized pass per block offset.
+    """
+
+    def __init__(self, char_list, font, char_width, char_height):
+        self.char_list = char_list
+        self.char_width = char_width
+        self.char_height = char_height
+        bboxes = [font.getbbox(char) for char in char_list]
+        left = min(0, min(bbox[0] for bbox in bboxes))
+        top = min(0, min(bbox[1] for bbox in bboxes))
+        right = max(bbox[2] for bbox in bboxes)
+        bottom = max(bbox[3] for bbox in bboxes)
+        self.origin_x = -(left // char_width)
+        self.origin_y = -(top // char_height)
+        self.blocks_x = -(-(self.origin_x * char_width + right) // char_width)
+        self.blocks_y = -(-(self.origin_y * char_height + bottom) // char_height)
+        tile_size = (self.blocks_x * char_width, self.blocks_y * char_height)
+        masks = []
+        for char in char_list:
+            tile = Image.new("L", tile_size, 0)
+            ImageDraw.Draw(tile).text((self.origin_x * char_width, self.origin_y * char_height), char, fill=255,
+                                      font=font)
+            masks.append(np.array(tile))
+        masks = np.stack(masks).reshape(len(char_list), self.blocks_y, char_height, self.blocks_x, char_width)
+        self.masks = np.ascontiguousarray(masks.transpose(0, 1, 3, 2, 4))
+        self.extents = None
+        # Only the part of each block offset that some glyph actually reaches is composed
+        self.offsets = []
+        for a in reversed(range(self.blocks_y)):
+            for b in reversed(range(self.blocks_x)):
+                ys, xs = np.nonzero(self.masks[:, a, b].any(axis=0))
+                if len(ys):
+                    self.offsets.append((a, b, slice(ys.min(), ys.max() + 1), slice(xs.min(), xs.max() + 1)))
+
+    def canvas_blocks(self, num_rows, num_cols, out_height, out_width):
+        rows = max(self.origin_y - (-out_height // self.char_height), num_rows + self.blocks_y)
+        cols = max(self.origin_x - (-out_width // self.char_width), num_cols + self.blocks_x)
+        return rows, cols
+
+    def allocate(self, num_rows, num_cols, out_height, out_width, channels=0):
+        """Return a work canvas that compose() can reuse for every grid of the same geometry"""
+        rows, cols = self.canvas_blocks(num_rows, num_cols, out_height, out_width)
+        shape = (rows, self.char_height, cols, self.char_width) + ((channels,) if channels else ())
+        return np.empty(shape, dtype=np.uint16)
+
+    def compose(self, indices, fill, background, canvas):
+        """Draw the character grid `indices` on a background, overwriting the work canvas in place.
+
+        A scalar fill renders a grayscale canvas one text line per row, as ImageDraw.text does for a line.
+        An array fill of shape (num_rows, num_cols, 3) renders a color canvas one character per cell.
+        """
+        num_rows, num_cols = indices.shape
+        canvas[...] = background
+        if np.ndim(fill) == 0:
+            for a in reversed(range(self.blocks_y)):
+                offsets = [offset for offset in self.offsets if offset[0] == a]
+                if not offsets:
+                    continue
+                top = min(offset[2].start for offset in offsets)
+                bottom = max(offset[2].stop for offset in offsets)
+                layer = np.zeros((num_rows, bottom - top, canvas.shape[2], self.char_width), dtype=np.uint8)
+                for _, b, _, _ in offsets:
+                    target = layer[:, :, b:b + num_cols]
+                    np.maximum(target, self.masks[:, a, b, top:bottom][indices].transpose(0, 2, 1, 3), out=target)
+                blend(canvas[a:a + num_rows, top:bottom], layer, int(fill))
+        else:
+            ink = np.clip(fill, 0, 255).astype(np.uint16)[:, None, :, None, :]
+            for a, b, ys, xs in self.offsets:
+                mask = self.masks[:, a, b, ys, xs][indices].transpose(0, 2, 1, 3)[..., None]
+                blend(canvas[a:a + num_rows, ys, b:b + num_cols, xs], mask, ink)
+
+    def compose_blocks(self, indices, fill, background, canvas, block_rows, block_cols):
+        """Redraw only the given cell-sized blocks of a work canvas, from every glyph that reaches them.
+
+        Block (P, Q) of the canvas receives block (a, b) of the glyph in cell (P - a, Q - b), so each listed block
+        is rebuilt exactly as compose() would draw it.
+        """
+        num_rows, num_cols = indices.shape
+        blocks = np.empty((len(block_rows),) + canvas.shape[1:2] + canvas.shape[3:], dtype=np.uint16)
+        blocks[...] = background
+        offsets = [offset[:2] for offset in self.offsets]
+        if np.ndim(fill) == 0:
+            for a in reversed(range(self.blocks_y)):
+                layer = np.zeros((len(block_rows), self.char_height, self.char_width), dtype=np.uint8)
+                for b in range(self.blocks_x):
+                    if (a, b) not in offsets:
+                        continue
+                    rows, cols = block_rows - a, block_cols - b
+                    valid = (rows >= 0) & (rows < num_rows) & (cols >= 0) & (cols < num_cols)
+                    layer[valid] = np.maximum(layer[valid], self.masks[indices[rows[valid], cols[valid]], a, b])
+                blend(blocks, layer, int(fill))
+        else:
+            fill = np.clip(fill, 0, 255).astype(np.uint16)
+            for a, b in offsets:
+                rows, cols = block_rows - a, block_cols - b
+                valid = (rows >= 0) & (rows < num_rows) & (cols >= 0) & (cols < num_cols)
+                mask = np.zeros((len(block_rows), self.char_height, self.char_width, 1), dtype=np.uint8)
+                ink = np.zeros((len(block_rows), 1, 1, 3), dtype=np.uint16)
+                mask[valid, :, :, 0] = self.masks[indices[rows[valid], cols[valid]], a, b]
+                ink[valid, 0, 0] = fill[rows[valid], cols[valid]]
+                blend(blocks, mask, ink)
+        canvas[block_rows, :, block_cols] = blocks
+
+    def dirty_blocks(self, changed, canvas):
+        """Return the rows and columns of the canvas blocks touched by the glyphs of the changed cells"""
+        num_rows, num_cols = changed.shape
+        dirty = np.zeros((canvas.shape[0], canvas.shape[2]), dtype=bool)
+        for a, b, _, _ in self.offsets:
+            dirty[a:a + num_rows, b:b + num_cols] |= changed
+        return np.nonzero(dirty)
+
+    def view(self, canvas, out_height, out_width):
+        """Return the output region of a work canvas as a 2D image, without copying"""
+        rows, _, cols = canvas.shape[:3]
+        image = canvas.reshape((rows * self.char_height, cols * self.char_width) + canvas.shape[4:])
+        top = self.origin_y * self.char_height
+        left = self.origin_x * self.char_width
+        return image[top:top + out_height, left:left + out_width]
+
+    def strips(self, indices, fill, background, out_height, out_width, band_rows=64):
+        """Yield the image render() would return as consecutive horizontal strips of `band_rows` text lines.
+
+        Block row P of the canvas only receives glyphs from cell rows P - blocks_y + 1 to P, so each strip is
+        composed from its own cell rows plus that many rows above it, in a work canvas sized for one strip.
+        The yielded strips are views of that canvas, only valid until the next one.
+        """
+        num_rows, num_cols = indices.shape
+        colors = np.ndim(fill) != 0
+        _, cols = self.canvas_blocks(num_rows, num_cols, out_height, out_width)
+        shape = (band_rows + 2 * self.blocks_y, self.char_height, cols, self.char_width) + ((3,) if colors else ())
+        canvas = np.empty(shape, dtype=np.uint16)
+        image = canvas.reshape((shape[0] * self.char_height, cols * self.char_width) + shape[4:])
+        left = self.origin_x * self.char_width
+        first = self.origin_y
+        last = self.origin_y - (-out_height // self.char_height)
+        for start in range(first, last, band_rows):
+            stop = min(start + band_rows, last)
+            low = min(max(start - self.blocks_y + 1, 0), num_rows)
+            high = min(stop, num_rows)
+            if high > low:
+                self.compose(indices[low:high], fill[low:high] if colors else fill, background, canvas)
+            else:
+                canvas[...] = background
+            top = (start - low) * self.char_height
+            height = min(stop * self.char_height, first * self.char_height + out_height) - start * self.char_height
+            yield image[top:top + height, left:left + out_width]
+
+    def tile(self, index):
+        """Whole mask of a glyph, its blocks put back together"""
+        mask = self.masks[index]
+        return mask.transpose(0, 2, 1, 3).reshape(self.blocks_y * self.char_height, self.blocks_x * self.char_width)
+
+    def glyph_extents(self):
+        """First and last + 1 rows and columns of every glyph's mask that differ from the background, for every
+        ink strength |ink - background| from 0 to 255.
+
+        blend() changes a background pixel exactly when strength * coverage >= 128, so the rows and columns that
+        count are those whose largest coverage reaches ceil(128 / strength).
+        """
+        tiles = self.masks.transpose(0, 1, 3, 2, 4).reshape(len(self.char_list), self.blocks_y * self.char_height,
+                                                            self.blocks_x * self.char_width)
+        needed = np.full(256, 256)
+        needed[1:] = -(-128 // np.arange(1, 256))
+        extents = []
+        for profile in (tiles.max(axis=2), tiles.max(axis=1)):
+            inked = profile[:, None, :] >= needed[None, :, None]
+            found = inked.any(axis=2)
+            size = profile.shape[1]
+            extents.append((np.where(found, inked.argmax(axis=2), size),
+                            np.where(found, size - inked[:, :, ::-1].argmax(axis=2), 0)))
+        return extents, needed
+
+    def ink_box(self, indices, fill, background, out_height, out_width):
+        """Bounding box (left, top, right, bottom) of everything render() would draw differently from the
+        background, as content_box() finds it in the rendered image, but from the glyph masks alone.
+
+        Cells whose glyph is cut by the edges of the output are measured on their visible part. A glyph covering
+        another one with the exact background color is the only case where the box can be larger than the
+        rendered one.
+        """
+        if self.extents is None:
+            self.extents = self.glyph_extents()
+        ((row_first, row_last), (col_first, col_last)), needed = self.extents
+        num_rows, num_cols = indices.shape
+        if np.ndim(fill) == 0:
+            strength = np.full(indices.shape, abs(int(fill) - int(background)))
+        else:
+            strength = np.abs(np.clip(fill, 0, 255) - np.asarray(background)).max(axis=2)
+        tile_height, tile_width = self.blocks_y * self.char_height, self.blocks_x * self.char_width
+        # Output position of the top left corner of every cell's glyph mask
+        ys = np.arange(num_rows)[:, None] * self.char_height - self.origin_y * self.char_height
+        xs = np.arange(num_cols)[None, :] * self.char_width - self.origin_x * self.char_width
+        bottoms = row_last[indices, strength]
+        inked = bottoms > 0
+        inside = (ys >= 0) & (ys + tile_height <= out_height) & (xs >= 0) & (xs + tile_width <= out_width)
+        cells = inked & inside
+        tops, bottoms = [(ys + row_first[indices, strength])[cells]], [(ys + bottoms)[cells]]
+        lefts, rights = [(xs + col_first[indices, strength])[cells]], [(xs + col_last[indices, strength])[cells]]
+        for r, c in zip(*np.nonzero(inked & ~inside)):
+            y, x = ys[r, 0], xs[0, c]
+            top, left = max(-y, 0), max(-x, 0)
+            visible = self.tile(indices[r, c])[top:out_height - y, left:out_width - x] >= needed[strength[r, c]]
+            rows = np.nonzero(visible.any(axis=1))[0]
+            if len(rows):
+                cols = np.nonzero(visible.any(axis=0))[0]
+                tops.append([y + top + rows[0]])
+                bottoms.append([y + top + rows[-1] + 1])
+                lefts.append([x + left + cols[0]])
+                rights.append([x + left + cols[-1] + 1])
+        tops = np.concatenate(tops)
+        if not len(tops):
+            return None
+        return (int(np.concatenate(lefts).min()), int(tops.min()), int(np.concatenate(rights).max()),
+                int(np.concatenate(bottoms).max()))
+
+    def render_indexed(self, indices, color_ids, levels, out_height, out_width):
+        """Render a character grid as palette indices rather than colors.
+
+        Index 0 is the background and color k at coverage level l (1 to `levels`) is 1 + k * levels + l - 1.
+        Overlapping glyphs are not blended: each pixel takes the color of the most opaque glyph over it.
+        """
+        num_rows, num_cols = indices.shape
+        rows, cols = self.canvas_blocks(num_rows, num_cols, out_height, out_width)
+        coverage = np.zeros((rows, self.char_height, cols, self.char_width), dtype=np.uint8)
+        owners = np.zeros_like(coverage)
+        owner_ids = np.broadcast_to(color_ids.astype(np.uint8)[:, None, :, None],
+                                    (num_rows, self.char_height, num_cols, self.char_width))
+        for a, b, ys, xs in self.offsets:
+            mask = self.masks[:, a, b, ys, xs][indices].transpose(0, 2, 1, 3)
+            target = coverage[a:a + num_rows, ys, b:b + num_cols, xs]
+            stronger = mask > target
+            np.copyto(target, mask, where=stronger)
+            np.copyto(owners[a:a + num_rows, ys, b:b + num_cols, xs], owner_ids[:, ys, :, xs], where=stronger)
+        coverage = self.view(coverage, out_height, out_width)
+        owners = self.view(owners, out_height, out_width)
+        level = (coverage.astype(np.uint16) * levels + 127) // 255
+        return np.where(level > 0, owners * levels + level, 0).astype(np.uint8)
+
+    def render(self, indices, fill, background, out_height, out_width):
+        channels = 0 if np.ndim(fill) == 0 else 3
+        canvas = self.allocate(indices.shape[0], indices.shape[1], out_height, out_width, channels)
+        self.compose(indices, fill, background, canvas)
+        return self.view(canvas, out_height, out_width).astype(np.uint8)
+
+
+@lru_cache(maxsize=16)
+def get_atlas(char_list, font, char_width, char_height):
+    return GlyphAtlas(char_list, font, char_width, char_height)
@@ -0,0 +1,273 @@
+"""
+Local HTTP conversion service. Worker processes keep their converters (fonts, character ramps, glyph atlases)
+loaded between requests, and results are cached by input hash and parameters.
+
+    POST /convert?format=png&language=english&mode=standard&num_cols=300&background=black&color=1
+        body: the image file, raw or as the first file of a multipart/form-data upload
+        returns: the ASCII art as text (format=txt) or an encoded image (png, jpg, webp, bmp)
+    GET /stats
+        returns: JSON counters of the worker queue and the result cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+from converter import Converter, decode_image
+from languages import LANGUAGES, get_alphabet
+
+FORMATS = {"txt": "text/plain; charset=utf-8", "png": "image/png", "jpg": "image/jpeg", "webp": "image/webp",
+           "bmp": "image/bmp"}
+MAX_COLS = 1000
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("ASCII conversion server")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of conversion processes")
+    parser.add_argument("--queue_size", type=int, default=16,
+                        help="number of requests waiting for a worker before new ones are refused with 503")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds a request may wait for its result")
+    parser.add_argument("--cache_size", type=int, default=256, help="result cache size in MB, 0 to disable")
+    parser.add_argument("--max_upload", type=int, default=32, help="largest accepted upload in MB")
+    parser.add_argument("--preload", type=str, nargs="*", default=["english:standard"],
+                        help="language:mode pairs loaded by every worker at startup")
+    args = parser.parse_args(argv)
+    return args
+
+
+@lru_cache(maxsize=32)
+def get_converter(language, mode, num_cols, background, color):
+    return Converter(language, mode, num_cols, background, color)
+
+
+def init_worker(preload):
+    # Loads fonts, sorted character ramps and glyph atlases before the first request
+    for language, mode in preload:
+        for color in (False, True):
+            converter = get_converter(language, mode, 300, "black", color)
+            converter.to_image(np.zeros((300, 600, 3), dtype=np.uint8))
+            converter.release_canvas()
+
+
+def convert(data, params):
+    """Return the encoded conversion of an image file for the parsed request parameters"""
+    converter = get_converter(params["language"], params["mode"], params["num_cols"], params["background"],
+                              params["color"])
+    image = decode_image(data)
+    if params["format"] == "txt":
+        return converter.to_text(image).encode("utf-8")
+    try:
+        return converter.to_bytes(image, "." + params["format"])
+    finally:
+        # Canvases follow the size of each upload; keeping them would grow every cached converter without bound
+        converter.release_canvas()
+
+
+def parse_params(query):
+    """Validated conversion parameters of a query string, raising ValueError on a bad value"""
+    values = {key: items[-1] for key, items in parse_qs(query).items()}
+    params = {"format": values.get("format", "png"), "language": values.get("language", "english"),
+              "mode": values.get("mode", "standard"), "background": values.get("background", "black"),
+              "color": values.get("color", "0").lower() in ("1", "true", "yes")}
+    if params["format"] not in FORMATS:
+        raise ValueError("format must be one of {}".format(", ".join(FORMATS)))
+    if params["language"] not in LANGUAGES:
+        raise ValueError("language must be one of {}".format(", ".join(LANGUAGES)))
+    modes = get_alphabet(params["language"])
+    if params["mode"] not in modes:
+        raise ValueError("mode must be one of {} for {}".format(", ".join(modes), params["language"]))
+    if params["background"] not in ("black", "white"):
+        raise ValueError("background must be black or white")
+    try:
+        params["num_cols"] = int(values.get("num_cols", 150 if params["format"] == "txt" else 300))
+    except ValueError:
+        raise ValueError("num_cols must be an integer")
+    if not 1 <= params["num_cols"] <= MAX_COLS:
+        raise ValueError("num_cols must be between 1 and {}".format(MAX_COLS))
+    return params
+
+
+def read_upload(content_type, body):
+    """Image bytes of a request body, either raw or the first file of a multipart/form-data upload"""
+    if not content_type.startswith("multipart/form-data"):
+        return body
+    message = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n"
+                                                  + body)
+    for part in message.iter_parts():
+        if part.get_filename() is not None or part.get_param("name", header="content-disposition") == "image":
+            return part.get_payload(decode=True)
+    raise ValueError("No file in the multipart upload")
+
+
+class ResultCache(object):
+    """LRU cache of encoded results, bounded by the total size of the results"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """HTTP server whose handler threads hand conversions to a process pool, at most workers + queue_size at once"""
+    daemon_threads = True
+
+    def __init__(self, address, opt):
+        super(ConversionServer, self).__init__(address, RequestHandler)
+        self.opt = opt
+        preload = [tuple(item.split(":", 1)) if ":" in item else (item, "standard") for item in opt.preload]
+        self.executor = ProcessPoolExecutor(opt.workers, initializer=init_worker, initargs=(preload,))
+        self.slots = threading.BoundedSemaphore(opt.workers + opt.queue_size)
+        self.cache = ResultCache(opt.cache_size << 20)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "converted": 0, "rejected": 0, "failed": 0, "in_flight": 0}
+        # Start and warm every worker now rather than on the first requests
+        for future in [self.executor.submit(int) for _ in range(opt.workers)]:
+            future.result()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def finish(self):
+        """Free the slot of a conversion once its job has left the pool"""
+        self.count("in_flight", -1)
+        self.slots.release()
+
+    def server_close(self):
+        super(ConversionServer, self).server_close()
+        self.executor.shutdown(cancel_futures=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "ASCIIGenerator"
+
+    def reply(self, status, body, content_type="text/plain; charset=utf-8", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, status, message):
+        self.reply(status, (message + "\n").encode("utf-8"))
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/stats":
+            return self.error(404, "Not found")
+        server = self.server
+        with server.lock:
+            stats = dict(server.counters)
+        stats["cache"] = server.cache.stats()
+        stats["workers"] = server.opt.workers
+        stats["queue_size"] = server.opt.queue_size
+        self.reply(200, json.dumps(stats).encode("utf-8"), "application/json")
+
+    def do_POST(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path != "/convert":
+            return self.error(404, "Not found")
+        server.count("requests")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > server.opt.max_upload << 20:
+            return self.error(413, "Upload larger than {} MB".format(server.opt.max_upload))
+        body = self.rfile.read(length)
+        try:
+            params = parse_params(url.query)
+            data = read_upload(self.headers.get("Content-Type", ""), body)
+        except ValueError as e:
+            return self.error(400, str(e))
+        if not data:
+            return self.error(400, "Empty upload")
+        key = hashlib.sha1(data).hexdigest() + json.dumps(params, sort_keys=True)
+        result = server.cache.get(key)
+        if result is not None:
+            return self.reply(200, result, FORMATS[params["format"]], [("X-Cache", "hit")])
+        if not server.slots.acquire(blocking=False):
+            server.count("rejected")
+            return self.error(503, "Too many requests in progress")
+        server.count("in_flight")
+        release = True
+        try:
+            future = server.executor.submit(convert, data, params)
+            result = future.result(server.opt.timeout)
+        except TimeoutError:
+            # A queued job is dropped; a running one stays in flight and keeps its slot until it finishes, so that
+            # the pool never holds more than workers + queue_size jobs
+            if not future.cancel():
+                release = False
+                future.add_done_callback(lambda _: server.finish())
+            server.count("failed")
+            return self.error(504, "Conversion timed out")
+        except ValueError as e:
+            server.count("failed")
+            return self.error(400, str(e))
+        except Exception as e:
+            server.count("failed")
+            return self.error(500, "{}: {}".format(type(e).__name__, e))
+        finally:
+            if release:
+                server.finish()
+        server.count("converted")
+        server.cache.put(key, result)
+        self.reply(200, result, FORMATS[params["format"]], [("X-Cache", "miss")])
+
+
+def main(opt):
+    server = ConversionServer((opt.host, opt.port), opt)
+    print("Serving on http://{}:{} with {} workers".format(opt.host, opt.port, opt.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
@@ -0,0 +1,86 @@
+"""
+Structure-aware character selection: every cell is split into a grid of sub-cells and matched against the
+glyph bitmaps downsampled to the same grid, so that edges and lines pick characters of the same shape.
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+from grid import get_edges, cell_counts, reduce_cells, sums_to_means
+
+# Cells matched per matrix product, which bounds the (cells, glyphs) distance matrix
+CHUNK_CELLS = 1 << 16
+
+
+class ShapeMatcher(object):
+    """Nearest glyph search over the sub-cell luminances of all cells at once.
+
+    The cost of a glyph for a cell adds a brightness term, the squared distance between the glyph coverage and the
+    cell ink level spread over the sorted glyph coverages (dark cells ask for the most ink), and a structure term,
+    the correlation between the zero-mean sub-cell patterns of both. Dropping the parts that are constant per cell
+    leaves one constant per glyph and one dot product, so all cells are matched with a matrix product.
+    """
+
+    def __init__(self, char_list, font, char_width, char_height, subgrid=(4, 8), weight=2.0):
+        self.char_list = char_list
+        self.char_width = char_width
+        self.char_height = char_height
+        self.sub_cols, self.sub_rows = subgrid
+        # Weight of the brightness term against the structure term
+        self.weight = weight
+        # Glyphs are matched over the full line height, so that descenders and underscores are not cut off
+        ascent, descent = font.getmetrics()
+        self.glyph_height = max(ascent + descent, char_height)
+        self.bitmaps = []
+        for char in char_list:
+            cell = Image.new("L", (char_width, self.glyph_height), 0)
+            ImageDraw.Draw(cell).text((0, 0), char, fill=255, font=font)
+            self.bitmaps.append(np.array(cell))
+        self.glyphs = {}
+
+    def subgrid(self, cell_width, cell_height):
+        """Sub-cell grid for a cell size, smaller than requested when cells are only a few pixels wide"""
+        sub_cols = min(self.sub_cols, int(cell_width), self.char_width)
+        sub_rows = min(self.sub_rows, int(cell_height), self.glyph_height)
+        return max(sub_cols, 1), max(sub_rows, 1)
+
+    def edges(self, height, width, cell_width, cell_height, num_cols, num_rows):
+        sub_cols, sub_rows = self.subgrid(cell_width, cell_height)
+        return get_edges(height, width, cell_width / sub_cols, cell_height / sub_rows, num_cols * sub_cols,
+                         num_rows * sub_rows)
+
+    def glyph_features(self, sub_cols, sub_rows):
+        key = (sub_cols, sub_rows)
+        if key not in self.glyphs:
+            edges = get_edges(self.glyph_height, self.char_width, self.char_width / sub_cols,
+                              self.glyph_height / sub_rows, sub_cols, sub_rows)
+            features = np.stack([sums_to_means(reduce_cells(bitmap, edges), cell_counts(edges)).ravel() / 255
+                                 for bitmap in self.bitmaps]).astype(np.float32)
+            coverage = features.mean(axis=1)
+            pattern = features - coverage[:, None]
+            size = sub_cols * sub_rows
+            constant = self.weight * size * coverage ** 2
+            self.glyphs[key] = (pattern.T.copy(), coverage, constant, np.sort(coverage))
+        return self.glyphs[key]
+
+    def match(self, means, cell_width, cell_height):
+        """Return the glyph index of every cell from the (num_rows * sub_rows, num_cols * sub_cols) grid of
+        sub-cell luminances computed with edges()"""
+        sub_cols, sub_rows = self.subgrid(cell_width, cell_height)
+        patterns, coverage, constant, ramp = self.glyph_features(sub_cols, sub_rows)
+        num_rows, num_cols = means.shape[0] // sub_rows, means.shape[1] // sub_cols
+        targets = means.reshape(num_rows, sub_rows, num_cols, sub_cols).transpose(0, 2, 1, 3)
+        targets = targets.reshape(num_rows * num_cols, sub_rows * sub_cols)
+        indices = np.empty(num_rows * num_cols, dtype=np.intp)
+        for start in range(0, len(targets), CHUNK_CELLS):
+            ink = 1 - targets[start:start + CHUNK_CELLS].astype(np.float32) / 255
+            mean = ink.mean(axis=1, keepdims=True)
+            # Ink levels spread over the glyph coverages by rank, like the luminance ramps spread over characters
+            level = np.interp(mean, np.linspace(0, 1, len(ramp)), ramp).astype(np.float32)
+            distance = constant - 2 * ((ink - mean) @ patterns + self.weight * ink.shape[1] * level * coverage)
+            indices[start:start + CHUNK_CELLS] = np.argmin(distance, axis=1)
+        return indices.reshape(num_rows, num_cols)
+
+    def cell_means(self, means, cell_width, cell_height):
+        """Approximate cell luminances from the sub-cell ones"""
+        sub_cols, sub_rows = self.subgrid(cell_width, cell_height)
+        num_rows, num_cols = means.shape[0] // sub_rows, means.shape[1] // sub_cols
+        return means.reshape(num_rows, sub_rows, num_cols, sub_cols).mean(axis=(1, 3))
@@ -0,0 +1,65 @@
+import numpy as np
+
+ESC = "\x1b["
+CLEAR = ESC + "2J" + ESC + "H"
+RESET = ESC + "0m"
+HIDE_CURSOR = ESC + "?25l"
+SHOW_CURSOR = ESC + "?25h"
+
+
+def color_codes(colors, palette):
+    """Return the ANSI foreground escape sequence of every cell color (RGB, shape (rows, cols, 3))"""
+    colors = np.clip(colors, 0, 255)
+    if palette == "256":
+        # 6x6x6 color cube of the 256-color palette
+        cube = (colors * 5 + 127) // 255
+        codes = 16 + 36 * cube[:, :, 0] + 6 * cube[:, :, 1] + cube[:, :, 2]
+        return np.char.add(np.char.add(ESC + "38;5;", codes.astype(str)), "m")
+    codes = np.char.add(np.char.add(colors[:, :, 0].astype(str), ";"), colors[:, :, 1].astype(str))
+    codes = np.char.add(np.char.add(codes, ";"), colors[:, :, 2].astype(str))
+    return np.char.add(np.char.add(ESC + "38;2;", codes), "m")
+
+
+def format_rows(chars, codes=None):
+    """Join a grid of characters into row strings, switching color only where it changes along a row"""
+    if codes is None:
+        return ["".join(row) for row in chars]
+    rows = []
+    for row_chars, row_codes in zip(chars, codes):
+        parts = []
+        current = None
+        for char, code in zip(row_chars, row_codes):
+            if code != current:
+                parts.append(code)
+                current = code
+            parts.append(char)
+        parts.append(RESET)
+        rows.append("".join(parts))
+    return rows
+
+
+class TextScreen(object):
+    """Redraws a text frame in place with cursor movements, sending only the rows that changed"""
+
+    def __init__(self, output):
+        self.output = output
+        self.rows = None
+
+    def draw(self, rows):
+        """Draw a frame and return the number of rows that were sent"""
+        if self.rows is None or len(self.rows) != len(rows):
+            parts = [HIDE_CURSOR + CLEAR + "\n".join(rows)]
+            num_sent = len(rows)
+        else:
+            parts = [ESC + "{};1H".format(i + 1) + row for i, (row, previous) in enumerate(zip(rows, self.rows))
+                     if row != previous]
+            num_sent = len(parts)
+        self.rows = rows
+        self.output.write("".join(parts))
+        self.output.flush()
+        return num_sent
+
+    def close(self):
+        if self.rows is not None:
+            self.output.write(ESC + "{};1H".format(len(self.rows) + 1) + RESET + SHOW_CURSOR)
+            self.output.flush()
@@ -0,0 +1,23 @@
+"""
+Shared setup of the tests: the repository root on the import path, and data/input.jpg as the test image.
+
+Run the tests with `python -m pytest -q` from the root of the repository.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def input_path():
+    return os.path.join(ROOT, "data", "input.jpg")
+
+
+@pytest.fixture(scope="session")
+def image(input_path):
+    from converter import read_image
+    return read_image(input_path)
@@ -0,0 +1,20 @@
+"""
+Batch conversion tests on copies of data/input.jpg.
+"""
+import os
+import shutil
+
+import batch
+
+
+def test_output_inside_input(input_path, tmp_path):
+    # Outputs written under an input directory are not converted again by the next runs
+    shutil.copy(input_path, str(tmp_path / "input.jpg"))
+    output = str(tmp_path / "output")
+    for _ in range(3):
+        batch.main(batch.get_args(["--input", str(tmp_path), "--output", output, "--num_cols", "40",
+                                   "--workers", "1", "--check", "none"]))
+    assert sorted(os.listdir(output)) == ["input.jpg"]
+    pattern = os.path.join(str(tmp_path), "**", "*.jpg")
+    assert batch.find_images([pattern], exclude=os.path.abspath(output)) == [
+        (os.path.join(str(tmp_path), "input.jpg"), "input.jpg")]
@@ -0,0 +1,76 @@
+"""
+Regression tests: the Converter must keep producing the output of the original scripts on data/input.jpg.
+"""
+import hashlib
+
+import cv2
+import numpy as np
+import pytest
+
+from converter import Converter
+
+
+# SHA-256 of the pixels img2img.py and img2img_color.py wrote at the first commit of the repository, with their
+# default options (english, standard, 300 columns) and --background black or white. They depend on the bundled
+# font and on FreeType's rasterization, like the outputs themselves.
+IMAGE_HASHES = {
+    (False, "black"): "7fa4e7a5d1cd4a8bc77eebaa72d2858140a9df55419829947b7ed40c784cff69",
+    (False, "white"): "a7f7a3781aca319a52cc67ee0fe6a92e64f6b0657f5914cc72e9b13b0db0d111",
+    (True, "black"): "a60f75af796b5f984dc0fb988b8f301d29b6a81d921b2bb1fa82917a79a22aa8",
+    (True, "white"): "39c81633d01c0a259dc1c8e556751fb3a47ef9119ebccc1aee2d13d8284e3f42",
+}
+
+
+def reference_text(image, mode, num_cols):
+    """img2txt.py as it was first written, one np.mean per cell"""
+    if mode == "simple":
+        char_list = '@%#*+=-:. '
+    else:
+        char_list = "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\\|()1{}[]?-_+~<>i!lI;:,\"^`'. "
+    num_chars = len(char_list)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = image.shape
+    cell_width = width / num_cols
+    cell_height = 2 * cell_width
+    num_rows = int(height / cell_height)
+    if num_cols > width or num_rows > height:
+        cell_width = 6
+        cell_height = 12
+        num_cols = int(width / cell_width)
+        num_rows = int(height / cell_height)
+    lines = []
+    for i in range(num_rows):
+        line = ""
+        for j in range(num_cols):
+            cell = image[int(i * cell_height):min(int((i + 1) * cell_height), height),
+                         int(j * cell_width):min(int((j + 1) * cell_width), width)]
+            line += char_list[min(int(np.mean(cell) * num_chars / 255), num_chars - 1)]
+        lines.append(line + "\n")
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("mode", ["simple", "complex"])
+@pytest.mark.parametrize("num_cols", [150, 37])
+def test_text(image, mode, num_cols):
+    assert Converter("general", mode, num_cols).to_text(image) == reference_text(image, mode, num_cols)
+
+
+@pytest.mark.parametrize("color", [False, True])
+@pytest.mark.parametrize("background", ["black", "white"])
+def test_image(image, color, background):
+    out_image = np.asarray(Converter("english", "standard", 300, background, color=color,
+                                     divide_first=not color).to_pil(image))
+    assert hashlib.sha256(np.ascontiguousarray(out_image).tobytes()).hexdigest() == IMAGE_HASHES[color, background]
+
+
+@pytest.mark.parametrize("divide_first", [False, True])
+def test_rounding_boundary(divide_first):
+    # 7x14 cells summing to 4641: mean * 70 / 255 and mean / 255 * 70 truncate to different characters there
+    cell = np.full(7 * 14, 47, dtype=np.uint8)
+    cell[:35] = 48
+    image = np.tile(cell.reshape(14, 7), (3, 10))
+    mean = np.mean(cell)
+    expected = int(mean / 255 * 70) if divide_first else int(mean * 70 / 255)
+    indices = Converter("general", "complex", 10, divide_first=divide_first).analyze(image)[0]
+    assert indices.shape == (3, 10)
+    assert (indices == expected).all()
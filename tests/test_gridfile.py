@@ -0,0 +1,67 @@
+"""
+Grid files must give back the grids written to them, and render like the converter that made them.
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from converter import Converter
+from gridfile import GridWriter, grid_converter, grid_metadata, open_grid, save_grid
+import render_grid
+
+
+@pytest.mark.parametrize("color", [False, True])
+def test_grid_round_trip(image, tmp_path, color):
+    converter = Converter("english", "standard", 120, "black", color=color)
+    indices, colors = converter.analyze(image)
+    path = str(tmp_path / "image.grid")
+    save_grid(path, converter, image.shape, indices, colors)
+
+    grid = open_grid(path)
+    assert len(grid) == 1
+    assert grid.meta["char_list"] == converter.char_list
+    assert (grid.meta["height"], grid.meta["width"]) == image.shape[:2]
+    saved_indices, saved_colors = grid.frame(0)
+    np.testing.assert_array_equal(saved_indices, indices)
+    if color:
+        np.testing.assert_array_equal(saved_colors, np.clip(colors, 0, 255).astype(np.uint8))
+    else:
+        assert saved_colors is None
+    # A render from the file matches the direct render
+    np.testing.assert_array_equal(grid_converter(grid.meta, color=color).to_image(image, grid.frame(0)),
+                                  converter.to_image(image))
+
+
+def test_grid_frames(image, tmp_path):
+    converter = Converter("english", "standard", 80, "white", color=True)
+    frames = [image, image[::-1], cv2.GaussianBlur(image, (9, 9), 0)]
+    cells = [converter.analyze(frame) for frame in frames]
+    path = str(tmp_path / "video.grid")
+    writer = GridWriter(path, grid_metadata(converter, image.shape, cells[0][0].shape[0], fps=25))
+    for indices, colors in cells:
+        writer.write(indices, colors)
+    writer.close()
+
+    grid = open_grid(path)
+    assert len(grid) == len(frames)
+    assert grid.meta["fps"] == 25
+    for k in (2, 0, 1):
+        indices, colors = grid.frame(k)
+        np.testing.assert_array_equal(indices, cells[k][0])
+        np.testing.assert_array_equal(colors, np.clip(cells[k][1], 0, 255).astype(np.uint8))
+
+
+def test_render_video_ignores_frame(image, tmp_path):
+    # --frame only selects the frame of single-image outputs, a video renders them all
+    converter = Converter("english", "standard", 40, "black")
+    path = str(tmp_path / "video.grid")
+    writer = GridWriter(path, grid_metadata(converter, image.shape, converter.analyze(image)[0].shape[0], fps=25))
+    for _ in range(2):
+        writer.write(*converter.analyze(image))
+    writer.close()
+    output = str(tmp_path / "frames")
+    render_grid.main(render_grid.get_args(["--input", path, "--output", output, "--writer", "images",
+                                           "--frame", "5"]))
+    assert len(os.listdir(output)) == 2
@@ -0,0 +1,30 @@
+"""
+Tiled conversion must match whole-image conversion, whatever the output format.
+"""
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from converter import Converter
+from tiles import convert_tiled
+
+
+@pytest.mark.parametrize("color", [False, True])
+@pytest.mark.parametrize("background", ["black", "white"])
+@pytest.mark.parametrize("ext", [".png", ".npy"])
+def test_tiled(image, tmp_path, color, background, ext):
+    converter = Converter("english", "standard", 200, background, color=color)
+    expected = np.asarray(converter.to_pil(image))
+    # Read in bands from a PPM, rendered a few rows of characters at a time
+    input_path = str(tmp_path / "input.ppm")
+    cv2.imwrite(input_path, image)
+    output_path = str(tmp_path / ("output" + ext))
+    convert_tiled(converter, input_path, output_path, band_rows=7)
+    if ext == ".png":
+        out_image = np.asarray(Image.open(output_path))
+    else:
+        out_image = np.load(output_path)
+        if color:
+            out_image = out_image[:, :, ::-1]
+    np.testing.assert_array_equal(out_image, expected)
@@ -0,0 +1,97 @@
+"""
+Video conversion tests on a short clip made from data/input.jpg.
+"""
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+import video
+from converter import Converter
+
+NUM_FRAMES = 12
+
+
+@pytest.fixture(scope="module")
+def clip(image, tmp_path_factory):
+    """A block moving over the input image, so that most cells stay the same from one frame to the next"""
+    image = cv2.resize(image, (320, 240))
+    path = str(tmp_path_factory.mktemp("clip") / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (image.shape[1], image.shape[0]))
+    for k in range(NUM_FRAMES):
+        frame = image.copy()
+        frame[80:160, 20 * k:20 * k + 60] = (40, 200, 120)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def convert(clip, output, color=False, *args):
+    """Convert the clip to a directory of PNG frames"""
+    video.main(video.get_args(["--input", clip, "--output", output, "--writer", "images", "--num_cols", "40"] +
+                              list(args)), color=color)
+
+
+def read_sequence(path):
+    return [cv2.imread(name) for name in sorted(glob.glob(os.path.join(path, "*.png")))]
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+@pytest.mark.parametrize("color", [False, True])
+def test_incremental(clip, tmp_path, workers, color):
+    # Redrawing only the cells that changed must give the frames of a full redraw
+    full, incremental = str(tmp_path / "full"), str(tmp_path / "incremental")
+    convert(clip, full, color)
+    convert(clip, incremental, color, "--incremental", "--workers", workers)
+    expected, frames = read_sequence(full), read_sequence(incremental)
+    assert len(frames) == len(expected) == NUM_FRAMES
+    for frame, expected_frame in zip(frames, expected):
+        np.testing.assert_array_equal(frame, expected_frame)
+
+
+@pytest.mark.parametrize("overlay_ratio", [0, 0.2])
+@pytest.mark.parametrize("color", [False, True])
+def test_gray_frames(image, color, overlay_ratio):
+    # Single-channel frames render like their BGR version
+    gray = cv2.cvtColor(cv2.resize(image, (320, 240)), cv2.COLOR_BGR2GRAY)
+    frames = [gray, cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)]
+    out_images = [next(Converter("english", "standard", 40, color=color).iter_video([frame], overlay_ratio))
+                  for frame in frames]
+    np.testing.assert_array_equal(*out_images)
+
+
+@pytest.mark.parametrize("args", [["--workers", "2"], ["--segments", "2"]])
+def test_threshold_needs_one_process(clip, tmp_path, args):
+    output = str(tmp_path / "output")
+    convert(clip, output, False, "--incremental", "--threshold", "20", *args)
+    assert not os.path.exists(output)
+
+
+FAKE_FFMPEG = """#!{python}
+# Stand-in for ffmpeg -f concat: fails on a missing segment, like ffmpeg, and writes the list of segments
+import sys
+listing = sys.argv[sys.argv.index("-i") + 1]
+paths = [line.strip()[len("file '"):-1] for line in open(listing)]
+for path in paths:
+    open(path).close()
+with open(sys.argv[-1], "w") as f:
+    f.write("\\n".join(paths))
+"""
+
+
+def test_segments_past_end(clip, tmp_path, monkeypatch):
+    # An --end past the end of the video leaves segments without frames, which are not joined
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ["PATH"])
+    output = str(tmp_path / "output.avi")
+    video.main(video.get_args(["--input", clip, "--output", output, "--num_cols", "40", "--segments", "3",
+                               "--end", "5"]))
+    # The range is clamped to the frames of the video, and split evenly between the segments
+    assert len(open(output).read().split("\n")) == 3
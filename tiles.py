@@ -0,0 +1,139 @@
+"""
+Bounded-memory conversion of very large images: the input is read in horizontal bands and the output is
+rendered and written in strips, so peak memory follows the band size rather than the image size.
+
+Binary PGM/PPM and .npy inputs are memory-mapped, other formats are decoded whole by OpenCV. Outputs are
+streamed as PNG, PGM/PPM or .npy.
+"""
+import os
+import struct
+import zlib
+
+import cv2
+import numpy as np
+
+
+class ArrayBands(object):
+    """Band reader over an array (possibly memory-mapped), in OpenCV's BGR order unless `rgb`"""
+
+    def __init__(self, array, rgb=False):
+        self.array = array
+        self.rgb = rgb
+        self.height, self.width = array.shape[:2]
+
+    def read(self, top, bottom):
+        band = self.array[top:bottom]
+        if self.rgb and band.ndim == 3:
+            band = band[:, :, ::-1]
+        return np.ascontiguousarray(band)
+
+
+def read_pnm_header(f):
+    """Return (magic, width, height, maxval, data offset) of a binary PGM/PPM file"""
+    tokens = []
+    while len(tokens) < 4:
+        line = f.readline()
+        if not line:
+            raise ValueError("Truncated PNM header")
+        tokens.extend(line.split(b"#")[0].split())
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    return magic, width, height, maxval, f.tell()
+
+
+def open_bands(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return ArrayBands(np.load(path, mmap_mode="r"))
+    if ext in (".pgm", ".ppm", ".pnm"):
+        with open(path, "rb") as f:
+            magic, width, height, maxval, offset = read_pnm_header(f)
+        if magic in (b"P5", b"P6") and maxval < 256:
+            shape = (height, width) if magic == b"P5" else (height, width, 3)
+            return ArrayBands(np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=shape), rgb=True)
+    # OpenCV has no band decoder, so peak memory follows the whole image for every other format
+    print("Decoding {} whole: only binary PGM/PPM and .npy inputs are read in bands".format(path))
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError("Cannot read image {}".format(path))
+    return ArrayBands(image)
+
+
+class PNMWriter(object):
+    def __init__(self, path, width, height, channels):
+        self.file = open(path, "wb")
+        self.file.write("{}\n{} {}\n255\n".format("P6" if channels else "P5", width, height).encode("ascii"))
+
+    def write(self, strip):
+        self.file.write(np.ascontiguousarray(strip[:, :, ::-1] if strip.ndim == 3 else strip).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+class PNGWriter(object):
+    """Streams rows into zlib-compressed IDAT chunks, without ever holding the whole image"""
+
+    def __init__(self, path, width, height, channels):
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2 if channels else 0, 0, 0, 0))
+        self.compressor = zlib.compressobj(6)
+
+    def chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    def write(self, strip):
+        rows = strip[:, :, ::-1].reshape(strip.shape[0], -1) if strip.ndim == 3 else strip
+        # Every row starts with its filter type, 0 for none
+        raw = np.zeros((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        raw[:, 1:] = rows
+        data = self.compressor.compress(raw.tobytes())
+        if data:
+            self.chunk(b"IDAT", data)
+
+    def close(self):
+        self.chunk(b"IDAT", self.compressor.flush())
+        self.chunk(b"IEND", b"")
+        self.file.close()
+
+
+class NPYWriter(object):
+    def __init__(self, path, width, height, channels):
+        shape = (height, width, channels) if channels else (height, width)
+        self.array = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape)
+        self.row = 0
+
+    def write(self, strip):
+        self.array[self.row:self.row + len(strip)] = strip
+        self.row += len(strip)
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+
+WRITERS = {".png": PNGWriter, ".pgm": PNMWriter, ".ppm": PNMWriter, ".pnm": PNMWriter, ".npy": NPYWriter}
+
+
+def writer_class(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError("Tiled output must be one of {}".format(", ".join(sorted(WRITERS))))
+    return WRITERS[ext]
+
+
+def open_writer(path, width, height, channels):
+    return writer_class(path)(path, width, height, channels)
+
+
+def convert_tiled(converter, input_path, output_path, band_rows=64):
+    """Convert an image file to an ASCII art file with a Converter, one band at a time"""
+    writer_type = writer_class(output_path)
+    (width, height), strips = converter.to_strips(open_bands(input_path), band_rows)
+    writer = writer_type(output_path, width, height, 3 if converter.color else 0)
+    try:
+        for strip in strips:
+            writer.write(strip)
+    finally:
+        writer.close()
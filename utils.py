@@ -1,19 +1,22 @@
+from functools import lru_cache
+
 import numpy as np
-from PIL import Image, ImageFont, ImageDraw, ImageOps
+from charset_cache import get_profile
+from languages import LANGUAGES, get_alphabet
+from profiling import timed
 
 
-def sort_chars(char_list, font, language):
-    if language == "chinese":
-        char_width, char_height = font.getsize("制")
-    elif language == "korean":
-        char_width, char_height = font.getsize("ㅊ")
-    elif language == "japanese":
-        char_width, char_height = font.getsize("あ")
-    elif language in ["english", "german", "french", "spanish", "italian", "portuguese", "polish"]:
-        char_width, char_height = font.getsize("A")
-    elif language == "russian":
-        char_width, char_height = font.getsize("A")
-    num_chars = min(len(char_list), 100)
+@lru_cache(maxsize=32)
+def load_font(path, size):
+    # PIL is only imported once a font is needed, which text conversions of sorted languages never do
+    from PIL import ImageFont
+    return ImageFont.truetype(path, size=size)
+
+
+@timed("measure_chars")
+def measure_chars(char_list, font, language):
+    from PIL import Image, ImageDraw, ImageOps
+    char_width, char_height = font.getsize(LANGUAGES[language].measure_character)
     out_width = char_width * len(char_list)
     out_height = char_height
     out_image = Image.new("L", (out_width, out_height), 255)
@@ -21,7 +24,26 @@ def sort_chars(char_list, font, language):
     draw.text((0, 0), char_list, fill=0, font=font)
     cropped_image = ImageOps.invert(out_image).getbbox()
     out_image = out_image.crop(cropped_image)
-    brightness = [np.mean(np.array(out_image)[:, 10 * i:10 * (i + 1)]) for i in range(len(char_list))]
+    brightness = [float(np.mean(np.array(out_image)[:, 10 * i:10 * (i + 1)])) for i in range(len(char_list))]
+    return brightness
+
+
+def measure_coverage(char_list, font, char_width, char_height):
+    """Fraction of its cell that every glyph covers, each one rendered alone in a char_width wide cell"""
+    from PIL import Image, ImageDraw
+    # Measured over the full line height, as in ShapeMatcher, so that descenders and underscores count
+    ascent, descent = font.getmetrics()
+    glyph_height = max(ascent + descent, char_height)
+    coverage = []
+    for char in char_list:
+        cell = Image.new("L", (char_width, glyph_height), 0)
+        ImageDraw.Draw(cell).text((0, 0), char, fill=255, font=font)
+        coverage.append(float(np.mean(np.array(cell))) / 255)
+    return coverage
+
+
+def select_chars(brightness, char_list):
+    num_chars = min(len(char_list), 100)
     char_list = list(char_list)
     zipped_lists = zip(brightness, char_list)
     zipped_lists = sorted(zipped_lists)
@@ -41,70 +63,19 @@ def sort_chars(char_list, font, language):
     return result
 
 
-def get_data(language, mode):
-    if language == "general":
-        from alphabets import GENERAL as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "english":
-        from alphabets import ENGLISH as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "german":
-        from alphabets import GERMAN as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "french":
-        from alphabets import FRENCH as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "italian":
-        from alphabets import ITALIAN as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "polish":
-        from alphabets import POLISH as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "portuguese":
-        from alphabets import PORTUGUESE as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "spanish":
-        from alphabets import SPANISH as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "A"
-        scale = 2
-    elif language == "russian":
-        from alphabets import RUSSIAN as character
-        font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=20)
-        sample_character = "Ш"
-        scale = 2
-    elif language == "chinese":
-        from alphabets import CHINESE as character
-        font = ImageFont.truetype("fonts/simsun.ttc", size=10)
-        sample_character = "制"
-        scale = 1
-    elif language == "korean":
-        from alphabets import KOREAN as character
-        font = ImageFont.truetype("fonts/arial-unicode.ttf", size=10)
-        sample_character = "ㅊ"
-        scale = 1
-    elif language == "japanese":
-        from alphabets import JAPANESE as character
-        font = ImageFont.truetype("fonts/arial-unicode.ttf", size=10)
-        sample_character = "お"
-        scale = 1
-    else:
+def sort_chars(char_list, font, language):
+    return select_chars(measure_chars(char_list, font, language), char_list)
+
+
+def get_chars(language, mode, ramp="standard", font=None):
+    """Return the character list of a language and mode, sorted from most to least ink unless `ramp` is "coverage".
+
+    Sorting needs the language's font, loaded here if `font` is None; the sorted languages never load it.
+    """
+    if language not in LANGUAGES:
         print("Invalid language")
-        return None, None, None, None
+        return None
+    character = get_alphabet(language)
     try:
         if len(character) > 1:
             char_list = character[mode]
@@ -112,8 +83,27 @@ def get_data(language, mode):
             char_list = character["standard"]
     except:
         print("Invalid mode for {}".format(language))
-        return None, None, None, None
-    if language != "general":
-        char_list = sort_chars(char_list, font, language)
+        return None
+    if ramp == "coverage" or LANGUAGES[language].sorted:
+        # Left unsorted for coverage ramps, the caller orders it by the exact coverage of every glyph (see ramp.py)
+        return char_list
+    if font is None:
+        font = get_font(language)
+    return get_profile(language, mode, char_list, font, measure_chars, select_chars)["char_list"]
+
 
-    return char_list, font, sample_character, scale
+def get_font(language, size=None):
+    spec = LANGUAGES[language]
+    return load_font(spec.font_path, size or spec.font_size)
+
+
+def get_data(language, mode, ramp="standard"):
+    if language not in LANGUAGES:
+        print("Invalid language")
+        return None, None, None, None
+    font = get_font(language)
+    char_list = get_chars(language, mode, ramp, font)
+    if char_list is None:
+        return None, None, None, None
+    spec = LANGUAGES[language]
+    return char_list, font, spec.sample_character, spec.scale
@@ -0,0 +1,197 @@
+"""
+Video to ASCII art video, shared by video2video.py (grayscale) and video2video_color.py (color): frames are
+decoded on a thread, rendered by worker processes and encoded on a thread, or split into segments converted in
+parallel and joined.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import cv2
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs
+from gridfile import GridWriter, grid_metadata, add_grid_args
+from pipeline import read_frames, map_frames, sample_range, split_frames
+from writers import WRITERS, open_video_writer, segment_backend, concat_segments
+
+
+def get_args(argv=None, mode="complex", background="black"):
+    """Options of the video scripts, whose defaults differ only in `mode` and `background`"""
+    parser = argparse.ArgumentParser("Image to ASCII")
+    parser.add_argument("--input", type=str, default="data/input.mp4", help="Path to input video")
+    parser.add_argument("--output", type=str, default="data/output.mp4", help="Path to output video")
+    parser.add_argument("--mode", type=str, default=mode, choices=["simple", "complex"],
+                        help="10 or 70 different characters")
+    parser.add_argument("--background", type=str, default=background, choices=["black", "white"],
+                        help="background's color")
+    parser.add_argument("--num_cols", type=int, default=100, help="number of character for output's width")
+    parser.add_argument("--scale", type=int, default=1, help="upsize output")
+    parser.add_argument("--fps", type=int, default=0, help="frame per second")
+    parser.add_argument("--start", type=float, default=0, help="time in seconds of the first frame converted")
+    parser.add_argument("--end", type=float, default=0, help="time in seconds where conversion stops, 0 for the end")
+    parser.add_argument("--every_nth", type=int, default=1, help="convert one frame out of every n")
+    parser.add_argument("--target_fps", type=float, default=0,
+                        help="sample frames to approach this frame rate, instead of --every_nth")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="split the video into this many time ranges, converted by --workers processes, "
+                             "each into its own file, then joined")
+    parser.add_argument("--writer", type=str, default="cv2", choices=["cv2", "ffmpeg", "images"],
+                        help="OpenCV VideoWriter, raw frames piped to ffmpeg, or one image per frame")
+    parser.add_argument("--codec", type=str, default=None,
+                        help="FourCC for cv2 (XVID by default) or ffmpeg encoder (libx264 by default)")
+    parser.add_argument("--write_queue", type=int, default=8,
+                        help="number of frames waiting for the encoder thread, 0 to encode in the main thread")
+    parser.add_argument("--overlay_ratio", type=float, default=0.2, help="Overlay width ratio")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes rendering frames in parallel")
+    parser.add_argument("--queue_depth", type=int, default=8, help="number of frames decoded or rendered ahead")
+    parser.add_argument("--incremental", action="store_true", help="only redraw the cells that changed")
+    parser.add_argument("--threshold", type=float, default=0,
+                        help="luminance change below which an incremental cell keeps its character, "
+                             "with --workers 1 and --segments 1 only")
+    add_mapping_args(parser)
+    add_grid_args(parser, frames=True)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
+    return args
+
+
+_state = {}
+
+
+def init_worker(opt, color, plan=None):
+    profiling.start(opt)
+    if _state.get("opt") is not opt:
+        _state["opt"] = opt
+        _state["converter"] = Converter("general", opt.mode, opt.num_cols, opt.background, color=color,
+                                        font_size=int(10 * opt.scale), **mapping_kwargs(opt))
+    _state["plan"] = plan
+
+
+def convert_frame(frame):
+    opt = _state["opt"]
+    converter = _state["converter"]
+    if _state["plan"] is None:
+        # Frames rendered here are reused only once the writer queue and thread cannot hold them anymore
+        _state["plan"] = converter.plan(frame, opt.overlay_ratio, opt.incremental, opt.threshold,
+                                        gray=WRITERS[opt.writer].accepts_gray, num_frames=opt.write_queue + 2)
+    plan = _state["plan"]
+    with profiling.stage("frame"):
+        cells = converter.frame_cells(frame, plan)
+        out_image = converter.render_cells(cells[0], cells[1], frame, plan)
+    # Stages recorded in a worker process travel back with the frame, and so does the grid when it is saved
+    return out_image, plan.reused, profiling.drain() if opt.profile else None, cells if opt.save_grid else None
+
+
+def convert_segment(segment):
+    """Convert the frames first, first + step, ... before stop into their own output at `path`"""
+    first, stop, step, fps, path = segment
+    opt = _state["opt"]
+    cap = cv2.VideoCapture(opt.input)
+    out = None
+    for frame in read_frames(cap, opt.queue_depth, first, stop, step):
+        out_image, _, profile, _ = convert_frame(frame)
+        if profile is not None:
+            profiling.merge(profile)
+        if out is None:
+            out = open_video_writer(segment_backend(opt.writer), path, out_image.shape[1], out_image.shape[0],
+                                    out_image.shape[2] if out_image.ndim == 3 else 0, fps, opt.codec)
+        with profiling.stage("write"):
+            out.write(out_image)
+    cap.release()
+    if out is not None:
+        out.close()
+    return profiling.drain() if opt.profile else None
+
+
+def convert_segments(opt, color, cap, first, stop, step, fps):
+    if stop is None:
+        stop = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if stop <= 0:
+            print("The video does not report its number of frames, so it cannot be split into segments")
+            return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    flag, frame = cap.read()
+    cap.release()
+    if not flag:
+        print("No frame to convert")
+        return
+    # Every segment renders with the plan of the first frame, so that they all share the same crop
+    init_worker(opt, color)
+    out_image, _, profile, _ = convert_frame(frame)
+    if profile is not None:
+        profiling.merge(profile)
+    workdir = tempfile.mkdtemp(prefix=".segments-", dir=os.path.dirname(os.path.abspath(opt.output)))
+    extension = os.path.splitext(opt.output)[1] if segment_backend(opt.writer) != "images" else ""
+    segments = [(low, high, step, fps, os.path.join(workdir, "{:04d}{}".format(i, extension)))
+                for i, (low, high) in enumerate(split_frames(first, stop, step, opt.segments))]
+    try:
+        for profile in map_frames(convert_segment, segments, opt.workers, 0, init_worker,
+                                  (opt, color, _state["plan"])):
+            if profile is not None:
+                profiling.merge(profile)
+        with profiling.stage("concat"):
+            concat_segments(opt.writer, [segment[-1] for segment in segments], opt.output, out_image.shape[1],
+                            out_image.shape[0], out_image.shape[2] if out_image.ndim == 3 else 0, fps, opt.codec)
+    finally:
+        shutil.rmtree(workdir)
+    profiling.finish(opt, "frame")
+
+
+def main(opt, color=False):
+    cap = cv2.VideoCapture(opt.input)
+    first, stop, step = sample_range(cap, opt.start, opt.end, opt.every_nth, opt.target_fps)
+    if opt.fps == 0:
+        fps = cap.get(cv2.CAP_PROP_FPS) / step
+    else:
+        fps = opt.fps
+    if opt.threshold and (opt.workers > 1 or opt.segments > 1):
+        # Every process compares a frame with the last one it rendered itself, not with the previous frame
+        print("--threshold compares every frame with the previous one, so it needs --workers 1 and --segments 1")
+        return
+    if opt.segments > 1:
+        if opt.save_grid:
+            print("Saving the grid is not available with segments")
+            return
+        convert_segments(opt, color, cap, first, stop, step, fps)
+        return
+    frames = read_frames(cap, opt.queue_depth, first, stop, step)
+    init_worker(opt, color)
+    out = None
+    grid = None
+    reused = []
+    for frame in frames:
+        # The first frame fixes the render plan that every worker then shares
+        out_image, _, profile, cells = convert_frame(frame)
+        if profile is not None:
+            profiling.merge(profile)
+        out = open_video_writer(opt.writer, opt.output, out_image.shape[1], out_image.shape[0],
+                                out_image.shape[2] if out_image.ndim == 3 else 0, fps, opt.codec, opt.write_queue)
+        with profiling.stage("write"):
+            out.write(out_image)
+        if cells is not None:
+            grid = GridWriter(opt.save_grid, grid_metadata(_state["converter"], frame.shape, cells[0].shape[0], fps))
+            grid.write(*cells)
+        break
+    for out_image, num_reused, profile, cells in map_frames(convert_frame, frames, opt.workers, opt.queue_depth,
+                                                            init_worker, (opt, color, _state["plan"])):
+        if profile is not None:
+            profiling.merge(profile)
+        with profiling.stage("write"):
+            out.write(out_image)
+        if cells is not None:
+            grid.write(*cells)
+        reused.append(num_reused)
+    cap.release()
+    if out is not None:
+        out.close()
+    if grid is not None:
+        grid.close()
+    if opt.incremental and reused:
+        num_cells = _state["plan"].num_rows * _state["plan"].num_cols
+        previous = "the previous frame" if opt.workers <= 1 else "the last frame rendered by the same worker"
+        print("Reused {:.1f}% of cells per frame on average (min {:.1f}%, max {:.1f}%) over {} frames, "
+              "compared with {}".format(100 * sum(reused) / (len(reused) * num_cells), 100 * min(reused) / num_cells,
+                                        100 * max(reused) / num_cells, len(reused), previous))
+    profiling.finish(opt, "frame")
+
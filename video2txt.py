@@ -0,0 +1,85 @@
+"""
+Stream a video as text frames to the terminal or a file, optionally colored with ANSI escape codes.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import profiling
+from converter import Converter, add_mapping_args, mapping_kwargs
+from grid import char_lut
+from terminal import TextScreen, color_codes, format_rows
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser("Video to ASCII text stream")
+    parser.add_argument("--input", type=str, default="data/input.mp4", help="Path to input video")
+    parser.add_argument("--output", type=str, default="-", help="Path to output text file, - for stdout")
+    parser.add_argument("--mode", type=str, default="simple", choices=["simple", "complex"],
+                        help="10 or 70 different characters")
+    parser.add_argument("--num_cols", type=int, default=100, help="number of character for output's width")
+    parser.add_argument("--color", type=str, default="none", choices=["none", "256", "truecolor"],
+                        help="ANSI colors of the characters")
+    parser.add_argument("--fps", type=float, default=0, help="frame per second, the video's own by default")
+    parser.add_argument("--no_pacing", action="store_true",
+                        help="write frames as fast as possible instead of at the video's frame rate")
+    add_mapping_args(parser)
+    profiling.add_args(parser)
+    args = parser.parse_args(argv)
+    return args
+
+
+def main(opt):
+    profiling.start(opt)
+    cap = cv2.VideoCapture(opt.input)
+    fps = opt.fps or cap.get(cv2.CAP_PROP_FPS) or 25
+    converter = Converter("general", opt.mode, opt.num_cols, color=opt.color != "none", **mapping_kwargs(opt))
+    lut = char_lut(converter.char_list)
+    if opt.output == "-":
+        output = sys.stdout
+    else:
+        output = open(opt.output, "w", encoding="utf-8")
+    screen = TextScreen(output)
+    plan = None
+    num_shown = num_dropped = num_sent = 0
+    interval = 1 / fps
+    start = time.monotonic()
+    index = 0
+    while cap.isOpened():
+        due = start + index * interval
+        index += 1
+        if not opt.no_pacing and time.monotonic() > due + interval:
+            # More than a frame behind: skip this one without converting it
+            if not cap.grab():
+                break
+            num_dropped += 1
+            continue
+        with profiling.stage("decode"):
+            flag, frame = cap.read()
+        if not flag:
+            break
+        if plan is None:
+            plan = converter.plan(frame)
+        with profiling.stage("frame"):
+            indices, colors = converter.frame_cells(frame, plan)
+            codes = None if colors is None else color_codes(colors[:, :, ::-1], opt.color)
+            rows = format_rows(lut[indices], codes)
+        if not opt.no_pacing:
+            time.sleep(max(due - time.monotonic(), 0))
+        with profiling.stage("encode"):
+            num_sent += screen.draw(rows)
+        num_shown += 1
+    cap.release()
+    screen.close()
+    if output is not sys.stdout:
+        output.close()
+    if num_shown:
+        print("Shown {} frames, dropped {}, {:.1f} changed rows per frame out of {}".format(
+            num_shown, num_dropped, num_sent / num_shown, plan.num_rows), file=sys.stderr)
+    profiling.finish(opt, "frame", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    opt = get_args()
+    main(opt)
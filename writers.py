@@ -0,0 +1,178 @@
+"""
+Video writers behind one interface: write(frame) for every uint8 frame, BGR (height, width, 3) or grayscale
+(height, width) when the writer accepts it, then close().
+
+Frames are handed to the encoder as they are, without conversion or copy, so a caller passing reused buffers
+must not overwrite a frame before write() returns, or before the frame leaves the queue of a ThreadedWriter.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+import profiling
+
+
+class CV2Writer(object):
+    """cv2.VideoWriter with any FourCC codec OpenCV was built with"""
+    accepts_gray = False
+
+    def __init__(self, path, width, height, channels, fps, codec="XVID"):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+        if not self.writer.isOpened():
+            raise ValueError("OpenCV cannot write {} with codec {}".format(path, codec))
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class FFmpegWriter(object):
+    """Raw frames piped to an ffmpeg subprocess, gray8 or bgr24 as they come out of the renderer"""
+    accepts_gray = True
+
+    def __init__(self, path, width, height, channels, fps, codec="libx264", executable="ffmpeg"):
+        if shutil.which(executable) is None:
+            raise ValueError("Cannot find {} on the PATH".format(executable))
+        command = [executable, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt",
+                   "bgr24" if channels else "gray", "-s", "{}x{}".format(width, height), "-r", str(fps), "-i", "-",
+                   "-c:v", codec, "-pix_fmt", "yuv420p", path]
+        if width % 2 or height % 2:
+            # yuv420p needs an even size, and cropped frames often are not: pad with one column or row
+            command[-1:-1] = ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        # The pipe reads straight from the array memory
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError("ffmpeg exited with status {}".format(self.process.returncode))
+
+
+def sequence_pattern(path):
+    """Image sequence paths are printf patterns; a plain path is a directory of numbered PNG files"""
+    return path if "%" in path else os.path.join(path, "%05d.png")
+
+
+class ImageSequenceWriter(object):
+    """One image per frame, named by formatting the frame number into a pattern such as frames/%05d.png"""
+    accepts_gray = True
+
+    def __init__(self, path, width, height, channels, fps, codec=None):
+        path = sequence_pattern(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pattern = path
+        self.index = 0
+
+    def write(self, frame):
+        if not cv2.imwrite(self.pattern % self.index, frame):
+            raise ValueError("Cannot write {}".format(self.pattern % self.index))
+        self.index += 1
+
+    def close(self):
+        pass
+
+
+class ThreadedWriter(object):
+    """Encodes frames on a background thread, at most `queue_depth` frames behind the caller"""
+
+    def __init__(self, writer, queue_depth):
+        self.writer = writer
+        self.frames = queue.Queue(maxsize=max(queue_depth, 1))
+        self.error = None
+        self.thread = threading.Thread(target=self.encode, daemon=True)
+        self.thread.start()
+
+    def encode(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    with profiling.stage("encode"):
+                        self.writer.write(frame)
+                except Exception as error:
+                    self.error = error
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame)
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+
+WRITERS = {"cv2": CV2Writer, "ffmpeg": FFmpegWriter, "images": ImageSequenceWriter}
+DEFAULT_CODECS = {"cv2": "XVID", "ffmpeg": "libx264", "images": None}
+
+
+def open_video_writer(backend, path, width, height, channels, fps, codec=None, queue_depth=0):
+    """Return a writer of the given backend, encoding on a background thread when queue_depth > 0"""
+    writer = WRITERS[backend](path, width, height, channels, fps, codec or DEFAULT_CODECS[backend])
+    if queue_depth > 0:
+        writer = ThreadedWriter(writer, queue_depth)
+    return writer
+
+
+def segment_backend(backend):
+    """Backend writing the segments of a segment-parallel conversion.
+
+    Segments are encoded with the output's own backend and codec, in parallel, and joined by ffmpeg without
+    encoding again. Without ffmpeg, OpenCV cannot copy a compressed stream, so cv2 segments are PNG sequences that
+    the parent process encodes one frame after the other when joining them: that step does not scale with the
+    workers, and the sequences take disk space in proportion to the video length.
+    """
+    if backend == "cv2" and shutil.which("ffmpeg") is None:
+        return "images"
+    return backend
+
+
+def concat_segments(backend, paths, output, width, height, channels, fps, codec=None):
+    """Join in order the segments written by segment_backend(backend) at `paths` into `output`.
+
+    Video segments are joined by ffmpeg without encoding again, image sequences are renumbered. A segment that
+    got no frame has no file and is left out, e.g. when the video is shorter than its reported number of frames.
+    """
+    if segment_backend(backend) != "images":
+        paths = [path for path in paths if os.path.exists(path)]
+        listing = output + ".segments.txt"
+        with open(listing, "w") as f:
+            for path in paths:
+                f.write("file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''")))
+        try:
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", listing, "-c",
+                            "copy", output], check=True)
+        finally:
+            os.remove(listing)
+        return
+    writer = open_video_writer(backend, output, width, height, channels, fps, codec)
+    try:
+        for path in paths:
+            pattern = sequence_pattern(path)
+            index = 0
+            while os.path.exists(pattern % index):
+                if backend == "images":
+                    # Renaming is enough to renumber the frames
+                    os.replace(pattern % index, writer.pattern % writer.index)
+                    writer.index += 1
+                else:
+                    writer.write(cv2.imread(pattern % index))
+                index += 1
+    finally:
+        writer.close()